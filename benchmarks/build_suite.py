@@ -0,0 +1,56 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Time making a large suite of tests with large defaults.
+
+Run from the top of the tree, against an installed or local gabbi::
+
+    PYTHONPATH=. python benchmarks/build_suite.py
+
+The suite has 2000 tests and its defaults have a 200 item data body
+and 50 request headers. The best of three runs of
+test_suite_from_dict is shown. Making HTTP clients is replaced with a
+no-op, since trees that make one client per test while building spend
+nearly all their time loading certificates.
+"""
+
+import sys
+import timeit
+import unittest
+
+from gabbi import handlers
+from gabbi import httpclient
+from gabbi import suitemaker
+
+suite_dict = {
+    'defaults': {
+        'data': {'items': [{'id': n, 'name': 'item-%d' % n}
+                           for n in range(200)]},
+        'request_headers': {'x-header-%d' % n: 'value-%d' % n
+                            for n in range(50)},
+    },
+    'tests': [{'name': 'test %d' % n, 'POST': '/items/%d' % n}
+              for n in range(2000)],
+}
+httpclient.get_http = lambda **kwargs: None
+handler_objects = [handler() for handler in handlers.RESPONSE_HANDLERS]
+
+
+def build():
+    suitemaker.test_suite_from_dict(
+        unittest.defaultTestLoader, 'bench', suite_dict, '.', 'localhost',
+        80, None, None, handlers=handler_objects)
+
+
+best = min(timeit.repeat(build, number=1, repeat=3))
+print('2000 tests %.3fs' % best)
+sys.stdout.flush()
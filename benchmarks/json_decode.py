@@ -0,0 +1,65 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Time making requests with multi-MB JSON response bodies.
+
+Run from the top of the tree, against an installed or local gabbi::
+
+    PYTHONPATH=. python benchmarks/json_decode.py
+
+A test with a response_json_paths check is run against an in-process
+WSGI application which returns the body. The time is that of the whole
+request and check, including decoding the body, which the JSON content
+handler is given as bytes if it sets loads_bytes, otherwise as a
+string. The best of five runs is shown for each size of body. Set
+GABBI_JSON_CODEC=json to time the standard library decoder.
+"""
+
+import gc
+import json
+import sys
+import timeit
+import unittest
+
+from gabbi import handlers
+from gabbi import suitemaker
+
+handler_objects = [handler() for handler in handlers.RESPONSE_HANDLERS]
+for size in (2, 8, 32):
+    items = []
+    length = 0
+    while length < size * 1024 * 1024:
+        item = {'id': len(items), 'name': 'item-%d' % len(items),
+                'tags': ['alpha', 'beta'], 'score': len(items) / 7,
+                'active': True, 'parent': None}
+        items.append(item)
+        length += len(json.dumps(item)) + 2
+    body = json.dumps({'items': items}).encode('utf-8')
+
+    def app(environ, start_response, body=body):
+        start_response('200 OK', [('Content-Type', 'application/json')])
+        return [body]
+
+    suite_dict = {'tests': [{
+        'name': 'large', 'GET': '/',
+        'response_json_paths': {'$.items[0].id': 0},
+    }]}
+    test = suitemaker.test_suite_from_dict(
+        unittest.defaultTestLoader, 'bench', suite_dict, '.', 'localhost', 80,
+        None, lambda app=app: app, handlers=handler_objects)._tests[0]
+    # The first request makes the client.
+    test._run_test()
+    gc.disable()
+    best = min(timeit.repeat(test._run_test, number=1, repeat=5))
+    gc.enable()
+    print('%2d MB %.4fs' % (len(body) // (1024 * 1024), best))
+sys.stdout.flush()
@@ -0,0 +1,43 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Time passing regular expression checks on multi-MB bodies.
+
+Run from the top of the tree, against an installed or local gabbi::
+
+    PYTHONPATH=. python benchmarks/passing_checks.py
+
+Each check matches near the start of the body, so the time is mostly
+spent on anything done besides the match, such as preparing a failure
+message that is not used. The best of five runs of the
+response_strings handler with ten regular expressions is shown for
+each size of body.
+"""
+
+import sys
+import timeit
+
+from gabbi import case
+from gabbi.handlers import core
+
+handler = core.StringResponseHandler()
+for size in (10, 40):
+    body = '{"id": 1, "name": "first"}' + ' ' * size * 1024 * 1024
+    regexes = ['/"id": 1/'] * 10
+    test_class = type('T', (case.HTTPTestCase,), {
+        'test_data': {'response_strings': regexes},
+        'content_handlers': [], 'content_type': 'application/json',
+        'response_data': None, 'output': body})
+    test = test_class('test_request')
+    best = min(timeit.repeat(lambda: handler(test), number=1, repeat=5))
+    print('%2d MB %.4fs' % (size, best))
+sys.stdout.flush()
@@ -0,0 +1,53 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Time response_strings on multi-MB JSON bodies.
+
+Run from the top of the tree, against an installed or local gabbi::
+
+    PYTHONPATH=. python benchmarks/response_strings.py
+
+The best of five runs of the response_strings handler is shown for
+each size of body and number of literal strings.
+"""
+
+import json
+import random
+import string
+import sys
+import timeit
+
+from gabbi import case
+from gabbi.handlers import core
+
+random.seed(1)
+handler = core.StringResponseHandler()
+for size, count in ((5, 3), (5, 40), (20, 3), (20, 40)):
+    names = []
+    length = 0
+    while length < size * 1024 * 1024:
+        names.append(''.join(random.choices(string.ascii_lowercase, k=8)))
+        length += 36
+    body = json.dumps([{'id': n, 'name': name}
+                       for n, name in enumerate(names)])
+    # Literals found through the body, and a regex.
+    step = len(names) // count
+    literals = [names[n * step + step - 1] for n in range(count)]
+    literals.append('/"id": %d,/' % (len(names) - 1))
+    test_class = type('T', (case.HTTPTestCase,), {
+        'test_data': {'response_strings': literals},
+        'content_handlers': [], 'content_type': 'application/json',
+        'response_data': None, 'output': body})
+    test = test_class('test_request')
+    best = min(timeit.repeat(lambda: handler(test), number=1, repeat=5))
+    print('%2d MB %2d literals and a regex %.4fs' % (size, count, best))
+sys.stdout.flush()
@@ -26,6 +26,7 @@ import numbers
 import os
 import re
 import sys
+import threading
 import time
 import unittest
 from unittest import result as unitresult
@@ -34,6 +35,7 @@ import urllib.parse as urlparse
 from gabbi import __version__
 from gabbi import exception
 from gabbi.handlers import base
+from gabbi import httpclient
 from gabbi import utils
 
 
@@ -51,6 +53,23 @@ REPLACERS = [
     'RESPONSE',
 ]
 
+# Replacers which refer to the state of an earlier test.
+PRIOR_REPLACERS = [
+    'LOCATION',
+    'COOKIE',
+    'LAST_URL',
+    'URL',
+    'HEADERS',
+    'RESPONSE',
+]
+
+# Guards the counting of consumers when response payloads are released.
+_RELEASE_LOCK = threading.Lock()
+
+# The total size, in bytes on disk, of the parsed data files which are
+# kept in memory for reuse by later tests.
+DATA_FILE_CACHE_SIZE = 64 * 1024 * 1024
+
 # The list of approved type casts and associated functions
 APPROVED_CASTS = {
     'int': int,
@@ -77,7 +96,13 @@ BASE_TEST = {
     'skip': '',
     'poll': {},
     'use_prior_test': True,
+    'depends_on': [],
+    'serial': False,
+    'tags': [],
     'disable_response_handler': False,
+    'stream': False,
+    'repeat': 1,
+    'warmup': 0,
     'timeout': 30,
     "http_version": 1,
 }
@@ -99,6 +124,56 @@ def potentialFailure(func):
     return wrapper
 
 
+class TestSpec:
+    """The state of one test.
+
+    Every test is an instance of HTTPTestCase. What makes one test
+    differ from another is held in its spec, and exposed as attributes
+    of the test.
+    """
+
+    __slots__ = (
+        'test_name', 'test_data', 'test_directory', 'test_base_name',
+        'test_loader_name', 'fixtures', 'inner_fixtures', 'host', 'port',
+        'intercept', 'prefix', 'content_handlers', 'response_handlers',
+        'prior', 'history', 'has_run', 'consumes', 'consumers',
+        'dependencies', 'cookie_jar', 'http', 'http_args',
+    )
+
+    def __init__(self, **fields):
+        self.test_name = None
+        self.test_loader_name = None
+        self.prior = None
+        self.has_run = False
+        # The tests whose response payload this test may use in
+        # templates, and the number of tests which may use this test's
+        # payload. Set when the suite is built, see gabbi.suitemaker.
+        self.consumes = ()
+        self.consumers = 0
+        # The tests which must run before this one when the suite runs
+        # its tests concurrently. None when the suite runs sequentially.
+        self.dependencies = None
+        # The cookie jar shared by the tests in the suite, if it has one.
+        self.cookie_jar = None
+        # The client for the test's requests is made from http_args
+        # when it is first used.
+        self.http = None
+        self.http_args = None
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+
+def _spec_attribute(name):
+    """Expose a field of a test's spec as an attribute of the test."""
+    def get(self):
+        return getattr(self._spec, name)
+
+    def set(self, value):
+        setattr(self._spec, name, value)
+
+    return property(get, set)
+
+
 def _is_complex_type(data):
     """If data is a list or dict return True."""
     return isinstance(data, list) or isinstance(data, dict)
@@ -116,7 +191,95 @@ class HTTPTestCase(unittest.TestCase):
 
     base_test = copy.copy(BASE_TEST)
 
+    test_name = _spec_attribute('test_name')
+    test_data = _spec_attribute('test_data')
+    test_directory = _spec_attribute('test_directory')
+    test_base_name = _spec_attribute('test_base_name')
+    fixtures = _spec_attribute('fixtures')
+    inner_fixtures = _spec_attribute('inner_fixtures')
+    host = _spec_attribute('host')
+    port = _spec_attribute('port')
+    intercept = _spec_attribute('intercept')
+    prefix = _spec_attribute('prefix')
+    content_handlers = _spec_attribute('content_handlers')
+    response_handlers = _spec_attribute('response_handlers')
+    prior = _spec_attribute('prior')
+    history = _spec_attribute('history')
+    has_run = _spec_attribute('has_run')
+    consumes = _spec_attribute('consumes')
+    consumers = _spec_attribute('consumers')
+    dependencies = _spec_attribute('dependencies')
+    cookie_jar = _spec_attribute('cookie_jar')
+
+    def __init__(self, methodName='runTest', spec=None):
+        super(HTTPTestCase, self).__init__(methodName)
+        self._spec = spec if spec is not None else TestSpec()
+
+    @property
+    def http(self):
+        """The client for this test's requests, made when first used."""
+        spec = self._spec
+        if spec.http is None and spec.http_args is not None:
+            spec.http = httpclient.get_http(**spec.http_args)
+        return spec.http
+
+    @http.setter
+    def http(self, value):
+        self._spec.http = value
+
+    @property
+    def output(self):
+        """The response body, decoded to a string if it is text.
+
+        It is decoded when first used, so a test which only checks data
+        its content handler parsed from the bytes never decodes it.
+        """
+        if '_output' not in self.__dict__:
+            try:
+                response, content = self.__dict__.pop('_undecoded_output')
+            except KeyError:
+                raise AttributeError('output')
+            self._output = utils.decode_response_content(response, content)
+        return self._output
+
+    @output.setter
+    def output(self, value):
+        self.__dict__.pop('_undecoded_output', None)
+        self._output = value
+
+    # Tests share a class, so they are distinguished by identity rather
+    # than by class and method name.
+    def __eq__(self, other):
+        return self is other
+
+    def __hash__(self):
+        return id(self)
+
+    def id(self):
+        if self._spec.test_name is None:
+            return super(HTTPTestCase, self).id()
+        return '%s.%s.%s' % (self._spec.test_loader_name,
+                             self._spec.test_name, self._testMethodName)
+
+    def __str__(self):
+        if self._spec.test_name is None:
+            return super(HTTPTestCase, self).__str__()
+        return '%s (%s)' % (self._testMethodName, self.id())
+
+    def __repr__(self):
+        if self._spec.test_name is None:
+            return super(HTTPTestCase, self).__repr__()
+        return '<%s testMethod=%s>' % (
+            self.id().rsplit('.', 1)[0], self._testMethodName)
+
     def setUp(self):
+        if self.host == '':
+            # tearDown is not called when setUp skips the test, so the
+            # payloads it would use are released here.
+            if not self.has_run:
+                self.has_run = True
+                self._release_consumed()
+            self.skipTest('No host configured')
         self._fixture_cleanups = []
         if not self.has_run:
             super(HTTPTestCase, self).setUp()
@@ -130,7 +293,8 @@ class HTTPTestCase(unittest.TestCase):
     def tearDown(self):
         if not self.has_run:
             super(HTTPTestCase, self).tearDown()
-        self.has_run = True
+            self.has_run = True
+            self._release_consumed()
         # Clean up an inner fixtures.
         for fixture in self._fixture_cleanups:
             fixture.cleanUp()
@@ -147,7 +311,9 @@ class HTTPTestCase(unittest.TestCase):
     def test_request(self):
         """Run this request if it has not yet run.
 
-        If there is a prior test in the sequence, run it first.
+        If there is a prior test in the sequence, run it first. When
+        the suite is run concurrently, run any tests this one depends
+        on instead.
         """
         self.cast = None
         if self.has_run:
@@ -157,11 +323,18 @@ class HTTPTestCase(unittest.TestCase):
         if skip:
             self.skipTest(skip)
 
-        if (self.prior and not self.prior.has_run and
-                self.test_data['use_prior_test']):
-            # Use a different result so we don't count this test
-            # in the results.
-            self.prior.run(unitresult.TestResult())
+        if self.test_data['use_prior_test']:
+            if self.dependencies is not None:
+                priors = self.dependencies
+            elif self.prior:
+                priors = [self.prior]
+            else:
+                priors = []
+            for prior in priors:
+                if not prior.has_run:
+                    # Use a different result so we don't count this
+                    # test in the results.
+                    prior.run(unitresult.TestResult())
         self._run_test()
 
     def get_content_handler(self, content_type):
@@ -174,10 +347,10 @@ class HTTPTestCase(unittest.TestCase):
     def replace_template(self, message, escape_regex=False):
         """Replace magic strings in message."""
         if isinstance(message, dict):
-            for k in message:
-                message[k] = self.replace_template(message[k],
-                                                   escape_regex=escape_regex)
-            return message
+            # Make a new dict so data shared between tests, such as a
+            # cached data file, is not changed.
+            return {k: self.replace_template(v, escape_regex=escape_regex)
+                    for k, v in message.items()}
 
         if isinstance(message, list):
             return [self.replace_template(line, escape_regex=escape_regex)
@@ -201,9 +374,32 @@ class HTTPTestCase(unittest.TestCase):
 
         return message
 
-    def load_data_file(self, filename):
-        """Read a file from the current test directory."""
-        return self._load_data_file(filename)
+    def load_data_file(self, filename, loads=None):
+        """Read a file from the current test directory.
+
+        If loads is provided, return the file's content parsed by it.
+        Parsed data is cached, by path and modification time, for use
+        by later tests and must not be changed.
+        """
+        if loads is None:
+            return self._load_data_file(filename)
+        path = os.path.abspath(self._data_file_path(filename))
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return loads(self._load_data_file(filename))
+        return _DATA_FILE_CACHE.get(
+            (path, stat.st_mtime_ns, stat.st_size, loads), stat.st_size,
+            lambda: loads(self._load_data_file(filename)))
+
+    def release_response(self):
+        """Discard the response body and the data decoded from it.
+
+        Headers, URL and location are small and are retained.
+        """
+        self.__dict__.pop('_output', None)
+        self.__dict__.pop('_undecoded_output', None)
+        self.__dict__.pop('response_data', None)
 
     def _assert_response(self):
         """Compare the response with expected data."""
@@ -219,6 +415,16 @@ class HTTPTestCase(unittest.TestCase):
         value = value.encode('UTF-8')
         return value
 
+    def _release_consumed(self):
+        """Release response payloads that no test yet to run can use."""
+        with _RELEASE_LOCK:
+            for referred_case in self.consumes:
+                referred_case.consumers -= 1
+                if not referred_case.consumers:
+                    referred_case.release_response()
+            if not self.consumers:
+                self.release_response()
+
     @staticmethod
     def _regex_replacer(replacer, escape_regex):
         """Wrap a replacer function to escape return values in a regex."""
@@ -284,7 +490,8 @@ class HTTPTestCase(unittest.TestCase):
     def _cookie_replace(self, message, escape_regex=False):
         """Replace $COOKIE in a message.
 
-        With cookie data from set-cookie in the prior request.
+        With cookie data from set-cookie in the prior request or, if the
+        suite has a cookie jar, with the cookies in the jar.
         """
         return re.sub(self._simple_replacer_regex('COOKIE'),
                       self._regex_replacer(self._cookie_replacer,
@@ -296,13 +503,15 @@ class HTTPTestCase(unittest.TestCase):
         case = match.group('case1') or match.group('case2')
         if case:
             referred_case = self.history[case]
+        elif self.cookie_jar is not None:
+            self.cookie_jar.clear_expired_cookies()
+            if not len(self.cookie_jar):
+                raise KeyError('cookie jar is empty')
+            return ','.join('%s=%s' % (cookie.name, cookie.value)
+                            for cookie in self.cookie_jar)
         else:
             referred_case = self.prior
-        response_cookie = referred_case.response['set-cookie']
-        cookie = cookies.SimpleCookie()
-        cookie.load(response_cookie)
-        cookie_string = cookie.output(attrs=[], header='', sep=',').strip()
-        return cookie_string
+        return _parse_cookie(referred_case.response['set-cookie'])
 
     def _headers_replace(self, message, escape_regex=False):
         """Replace a header indicator in a message.
@@ -372,8 +581,8 @@ class HTTPTestCase(unittest.TestCase):
             referred_case = self.prior
         return referred_case.location
 
-    def _load_data_file(self, filename):
-        """Read a file from the current test directory."""
+    def _data_file_path(self, filename):
+        """Locate a file in the current test directory."""
         path = os.path.join(self.test_directory, filename)
         has_dir_traversal = os.path.relpath(
             path, start=self.test_directory).startswith(os.pardir)
@@ -381,6 +590,11 @@ class HTTPTestCase(unittest.TestCase):
             raise ValueError(
                 'Attempted loading of data file outside test directory: %s'
                 % filename)
+        return path
+
+    def _load_data_file(self, filename):
+        """Read a file from the current test directory."""
+        path = self._data_file_path(filename)
         with open(path, mode='rb') as data_file:
             return data_file.read()
 
@@ -508,6 +722,38 @@ class HTTPTestCase(unittest.TestCase):
         if 'user-agent' not in (key.lower() for key in headers):
             headers['user-agent'] = "gabbi/%s (Python httpx)" % __version__
 
+        consumers = []
+        body_consumers = {}
+        for handler in self.response_handlers:
+            body_consumer = getattr(handler, 'body_consumer', None)
+            consumer = body_consumer(self) if body_consumer else None
+            if consumer is not None:
+                body_consumers[handler._key] = consumer
+        feeds = []
+
+        def stream(response):
+            """Choose a consumer for the streamed response body."""
+            content_type = response.get('content-type', '').lower()
+            handler = self.get_content_handler(content_type)
+            stream_consumer = getattr(handler, 'stream_consumer', None)
+            consumer = None
+            if (stream_consumer
+                    and not self.test_data['disable_response_handler']):
+                consumer = stream_consumer(self)
+                if consumer is not None:
+                    consumers.append(consumer)
+            if not body_consumers:
+                return consumer
+            # A text body is kept, unless a content handler consumes it,
+            # for the handlers which check the output.
+            feed = _BodyFeed(
+                consumers + list(body_consumers.values()),
+                keep=consumer is None and utils.not_binary(
+                    utils.parse_content_type(content_type)[0]))
+            feeds.append(feed)
+            return feed
+
+        self.response_timings = {}
         response, content = self.http.request(
             url,
             method=method,
@@ -515,29 +761,76 @@ class HTTPTestCase(unittest.TestCase):
             body=body,
             redirect=redirect,
             timeout=timeout,
+            stream=stream if self._streams() else None,
+            timings=self.response_timings,
         )
 
+        if feeds:
+            content = feeds[0].body(content)
+        else:
+            for consumer in body_consumers.values():
+                consumer.feed(content)
+        self.body_results = {key: consumer.close()
+                             for key, consumer in body_consumers.items()}
+
         # Set headers and location attributes for follow on requests
         self.response = response
         if 'location' in response:
             self.location = response['location']
 
-        # Decode and store response
-        decoded_output = utils.decode_response_content(response, content)
+        # Store the response, to be decoded when first used.
+        self.__dict__.pop('_output', None)
+        self._undecoded_output = (response, content)
         self.content_type = response.get('content-type', '').lower()
         loader_class = self.get_content_handler(self.content_type)
-        if (decoded_output and loader_class
+        if consumers:
+            # The body was given to the consumer, which provides the
+            # structured response data.
+            try:
+                self.response_data = consumers[0].close()
+            except exception.GabbiDataLoadError as exc:
+                raise AssertionError(
+                    'unable to load data as %s' % self.content_type) from exc
+        elif (content and loader_class
                 and not self.test_data['disable_response_handler']):
+            # Hand the raw body to handlers that can decode it themselves,
+            # so the string is only made if something else uses it.
+            if (getattr(loader_class, 'loads_bytes', False)
+                    and isinstance(content, bytes)
+                    and utils.extract_content_type(response)[1].lower()
+                    in ('utf-8', 'utf8')):
+                raw_output = content
+            else:
+                raw_output = self.output
             # save structured response data
             try:
-                self.response_data = loader_class.loads(decoded_output)
+                self.response_data = loader_class.loads(raw_output)
             except exception.GabbiDataLoadError as exc:
                 raise AssertionError(
                     'unable to load data as %s' % self.content_type) from exc
 
         else:
             self.response_data = None
-        self.output = decoded_output
+
+    def _streams(self):
+        """Report if the response body is to be streamed.
+
+        It is not when a response handler which reads the whole body,
+        such as response_strings, has something to check.
+        """
+        if not self.test_data['stream']:
+            return False
+        for handler in self.response_handlers:
+            if (not handler.reads_body
+                    or getattr(handler, 'stream_consumer', None)):
+                continue
+            value = self.test_data.get(handler._key)
+            if handler.test_key_value is None:
+                if value is not None:
+                    return False
+            elif value:
+                return False
+        return True
 
     def _replace_headers_template(self, test_name, headers):
         replaced_headers = {}
@@ -592,7 +885,7 @@ class HTTPTestCase(unittest.TestCase):
             failure = None
             while count:
                 try:
-                    self._run_request(
+                    self._run_requests(
                         full_url,
                         method,
                         headers,
@@ -616,7 +909,7 @@ class HTTPTestCase(unittest.TestCase):
             if failure:
                 raise failure
         else:
-            self._run_request(
+            self._run_requests(
                 full_url,
                 method,
                 headers,
@@ -626,6 +919,31 @@ class HTTPTestCase(unittest.TestCase):
             )
             self._assert_response()
 
+    def _run_requests(self, url, method, headers, body, redirect=False,
+                      timeout=30):
+        """Run the request as many times as the test asks.
+
+        The timings of the requests made after any warmup requests are
+        kept in latencies. The last response is the one checked.
+        """
+        counts = {}
+        for key, minimum in (('warmup', 0), ('repeat', 1)):
+            try:
+                counts[key] = int(self.replace_template(self.test_data[key]))
+            except (TypeError, ValueError):
+                counts[key] = None
+            if counts[key] is None or counts[key] < minimum:
+                raise exception.GabbiFormatError(
+                    '%s in test %s must be an integer of at least %s'
+                    % (key, self.test_data['name'], minimum))
+
+        self.latencies = []
+        for count in range(counts['warmup'] + counts['repeat']):
+            self._run_request(url, method, headers, body,
+                              redirect=redirect, timeout=timeout)
+            if count >= counts['warmup']:
+                self.latencies.append(self.response_timings)
+
     def _scheme_replace(self, message, escape_regex=False):
         """Replace $SCHEME with the current protocol."""
         scheme = re.escape(self.scheme) if escape_regex else self.scheme
@@ -720,19 +1038,15 @@ class HTTPTestCase(unittest.TestCase):
             if expected in iterable:
                 return
 
+            max_chars = int(os.getenv('GABBI_MAX_CHARS_OUTPUT',
+                                      MAX_CHARS_OUTPUT))
+            chunks = [self.output]
             if self.response_data:
                 dumper_class = self.get_content_handler(self.content_type)
                 if dumper_class:
-                    full_response = dumper_class.dumps(self.response_data,
-                                                       pretty=True, test=self)
-                else:
-                    full_response = self.output
-            else:
-                full_response = self.output
-
-            max_chars = os.getenv('GABBI_MAX_CHARS_OUTPUT', MAX_CHARS_OUTPUT)
-            response = full_response[0:max_chars]
-            is_truncated = (len(response) != len(full_response))
+                    chunks = dumper_class.iterdumps(self.response_data,
+                                                    pretty=True, test=self)
+            response, is_truncated = _head(chunks, max_chars)
 
             if iterable == self.output:
                 msg = "'%s' not found in %s%s" % (
@@ -757,3 +1071,114 @@ class HTTPTestCase(unittest.TestCase):
             else:
                 new_headers[key] = val
         return new_headers
+
+
+class _BodyFeed:
+    """Feed a streamed response body to several consumers.
+
+    Each consumer is fed until it returns True. If keep is True the
+    body is also kept.
+    """
+
+    def __init__(self, consumers, keep=False):
+        self.consumers = consumers
+        self.chunks = [] if keep else None
+
+    def feed(self, chunk):
+        if self.chunks is not None:
+            self.chunks.append(chunk)
+        self.consumers = [consumer for consumer in self.consumers
+                          if not consumer.feed(chunk)]
+        return not self.consumers and self.chunks is None
+
+    def body(self, content):
+        """Return the kept body, or content if it was not kept."""
+        if self.chunks is None:
+            return content
+        return b''.join(self.chunks)
+
+
+def _head(chunks, max_chars):
+    """Join chunks of text until there are more than max_chars.
+
+    Return the first max_chars characters and whether there were more.
+    """
+    head = []
+    length = 0
+    for chunk in chunks:
+        head.append(chunk)
+        length += len(chunk)
+        if length > max_chars:
+            break
+    text = ''.join(head)
+    return text[:max_chars], length > max_chars
+
+
+@functools.lru_cache(maxsize=128)
+def _parse_cookie(set_cookie):
+    """Turn a set-cookie header into name=value pairs."""
+    cookie = cookies.SimpleCookie()
+    cookie.load(set_cookie)
+    return cookie.output(attrs=[], header='', sep=',').strip()
+
+
+class _DataFileCache:
+    """A least recently used cache of parsed data files.
+
+    The total size of the cached files is kept under size bytes.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.used = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, size, load):
+        """Return the cached data for key, calling load if needed."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+        data = load()
+        if size <= self.size:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = (data, size)
+                    self.used += size
+                while self.used > self.size:
+                    _, (_, old_size) = self._entries.popitem(last=False)
+                    self.used -= old_size
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.used = 0
+
+
+_DATA_FILE_CACHE = _DataFileCache(DATA_FILE_CACHE_SIZE)
+
+
+_REFERENCE_REGEX = re.compile(
+    r"%s\$(?P<replacer>%s)" % (HTTPTestCase._history_regex,
+                               '|'.join(PRIOR_REPLACERS)))
+
+
+def find_references(data):
+    """Find the references to earlier tests made by templates in data.
+
+    Yield a (replacer, test name) pair for each reference, the name
+    is None when the reference is to the immediately prior test.
+    """
+    if isinstance(data, dict):
+        for key, value in data.items():
+            yield from find_references(key)
+            yield from find_references(value)
+    elif isinstance(data, list):
+        for item in data:
+            yield from find_references(item)
+    elif isinstance(data, str) and '$' in data:
+        for match in _REFERENCE_REGEX.finditer(data):
+            yield (match.group('replacer'),
+                   match.group('case1') or match.group('case2'))
@@ -23,9 +23,13 @@ Each sequence becomes a TestSuite.
 An entire directory of YAML files is a TestSuite of TestSuites.
 """
 
-import glob
+from concurrent import futures
+import fnmatch
 import inspect
+import io
+import json
 import os
+import re
 import unittest
 from unittest import suite
 import uuid
@@ -37,16 +41,23 @@ from gabbi import reporter
 from gabbi import suitemaker
 from gabbi import utils
 
+# A JSON file whose text has no tests key is not a suite.
+_JSON_TESTS_KEY = re.compile(r'"tests"\s*:')
+
 
 def build_tests(path, loader, host=None, port=8001, intercept=None,
                 test_loader_name=None, fixture_module=None,
                 response_handlers=None, content_handlers=None,
                 prefix='', require_ssl=False, cert_validate=True, url=None,
                 inner_fixtures=None, verbose=False,
-                use_prior_test=True, safe_yaml=True):
+                use_prior_test=True, safe_yaml=True, cache_dir=None,
+                select=None, load_workers=None, recursive=False,
+                include=None, exclude=None, tags=None, shard=None,
+                timings=None):
     """Read YAML files from a directory to create tests.
 
-    Each YAML file represents a list of HTTP requests.
+    Each YAML file represents a list of HTTP requests. JSON files, with
+    a top level ``tests`` key, are read as well.
 
     :param path: The directory where yaml files are located.
     :param loader: The TestLoader.
@@ -77,9 +88,45 @@ def build_tests(path, loader, host=None, port=8001, intercept=None,
     :param cert_validate: If ``False`` ssl server certificate will be ignored,
                         further it will not be validated if provided
                         (set cert_reqs=CERT_NONE to the Http object)
+    :param cache_dir: A directory in which to keep the parsed YAML files,
+                      for reuse while they are unchanged. Defaults to the
+                      ``GABBI_CACHE_DIR`` environment variable, if set.
+    :param select: A callable given the name of each test (see
+                   :attr:`gabbi.case.HTTPTestCase.test_name`) and the
+                   set of its ``tags`` which returns ``True`` if the test
+                   is to be included. Only the selected tests, and the
+                   tests they follow, are made. Defaults to matching the
+                   ``testNamePatterns`` of the loader
+                   (``python -m unittest -k``), if any.
+    :param load_workers: The number of processes in which to parse the
+                         YAML files. Defaults to the ``GABBI_LOAD_WORKERS``
+                         environment variable or, if that is not set, 1:
+                         the files are parsed in this process.
+    :param recursive: If ``True``, find files in the subdirectories of
+                      ``path`` too. The names of their tests begin with
+                      the subdirectory, joined to the file name by ``-``,
+                      such as ``nested-tagged`` for ``nested/tagged.yaml``.
+    :param include: Glob patterns, matched against the path of each file
+                    relative to ``path``, of the files to read. Defaults
+                    to ``['*.yaml', '*.json']``.
+    :param exclude: Glob patterns of files not to read, even if included.
+    :param tags: If set, only tests with at least one of these ``tags``
+                 are included.
+    :param shard: ``INDEX/COUNT``, for example ``2/4``, to read only the
+                  files in that one of COUNT shards, counting from 1. See
+                  :func:`gabbi.utils.shard_files`.
+    :param timings: The path to a JSON file of the seconds each file took
+                    to run before, keyed by its path relative to the
+                    directory of the JSON file, used to balance the
+                    shards. It may be saved by ``gabbi-run --timings``.
     :rtype: TestSuite containing multiple TestSuites (one for each YAML file).
     """
 
+    if cache_dir is None:
+        cache_dir = os.environ.get('GABBI_CACHE_DIR')
+    if load_workers is None:
+        load_workers = int(os.environ.get('GABBI_LOAD_WORKERS', 1))
+
     # If url is being used, reset host, port and prefix.
     if url:
         host, port, prefix, force_ssl = utils.host_info_from_target(url)
@@ -101,6 +148,13 @@ def build_tests(path, loader, host=None, port=8001, intercept=None,
     else:
         all_test_base_name = None
 
+    if select is None and getattr(loader, 'testNamePatterns', None):
+        select = _name_pattern_select(
+            loader.testNamePatterns,
+            test_loader_name or suitemaker.__name__)
+    if tags:
+        select = _tag_select(tags, select)
+
     # Initialize response and content handlers. This is effectively
     # duplication of effort but not results. This allows for
     # backwards compatibility for existing callers.
@@ -112,19 +166,57 @@ def build_tests(path, loader, host=None, port=8001, intercept=None,
         handler_objects.append(handler())
 
     top_suite = suite.TestSuite()
-    for test_file in glob.iglob('%s/*.yaml' % path):
-        if '_' in os.path.basename(test_file):
+    test_files = _find_test_files(path, recursive, include, exclude)
+    if shard:
+        index, count = utils.parse_shard(shard)
+        if timings:
+            names = [utils.timings_key(os.path.join(path, test_file),
+                                       timings)
+                     for test_file in test_files]
+        else:
+            names = [test_file.replace(os.sep, '/')
+                     for test_file in test_files]
+        chosen = set(utils.shard_files(
+            names, index, count,
+            utils.load_timings(timings) if timings else None))
+        test_files = [test_file for test_file, name
+                      in zip(test_files, names) if name in chosen]
+    suite_dicts = _load_test_files(
+        [os.path.join(path, test_file) for test_file in test_files],
+        safe_yaml, cache_dir, load_workers)
+    for test_file, suite_dict in zip(test_files, suite_dicts):
+        if suite_dict is None and test_file.endswith('.json'):
+            # JSON data used by the tests, not a suite.
+            continue
+        if '_' in test_file:
             warnings.warn(exception.GabbiSyntaxWarning(
                 "'_' in test filename %s. This can break suite grouping."
-                % test_file))
+                % os.path.join(path, test_file)))
         if intercept:
             host = str(uuid.uuid4())
-        suite_dict = utils.load_yaml(yaml_file=test_file,
-                                     safe=safe_yaml)
-        test_base_name = os.path.splitext(os.path.basename(test_file))[0]
+        test_directory, test_base_name = os.path.split(
+            os.path.splitext(test_file)[0])
+        if test_directory:
+            # Not joined with '.', which separates the parts of a
+            # unittest id.
+            test_base_name = '%s-%s' % (
+                test_directory.replace(os.sep, '-'), test_base_name)
+            test_directory = os.path.join(path, test_directory)
+        else:
+            test_directory = path
         if all_test_base_name:
             test_base_name = '%s_%s' % (all_test_base_name, test_base_name)
 
+        # Resolve the selection against the names and tags of the
+        # tests, before any are made, and skip files which have none
+        # selected.
+        selected = None
+        if select is not None:
+            selected = suitemaker.select_tests(test_base_name, suite_dict,
+                                               select)
+            if selected == []:
+                continue
+
         if require_ssl:
             if 'defaults' in suite_dict:
                 suite_dict['defaults']['ssl'] = True
@@ -150,24 +242,269 @@ def build_tests(path, loader, host=None, port=8001, intercept=None,
                 suite_dict['defaults'] = {'use_prior_test': use_prior_test}
 
         file_suite = suitemaker.test_suite_from_dict(
-            loader, test_base_name, suite_dict, path, host, port,
+            loader, test_base_name, suite_dict, test_directory, host, port,
             fixture_module, intercept, prefix=prefix,
             test_loader_name=test_loader_name, handlers=handler_objects,
-            inner_fixtures=inner_fixtures)
+            inner_fixtures=inner_fixtures, select=selected)
         top_suite.addTest(file_suite)
     return top_suite
 
 
+def _find_test_files(path, recursive, include, exclude):
+    """List the files to read in path, relative to it, in sorted order.
+
+    As with glob, files and directories whose names start with ``.``
+    are ignored.
+    """
+    include = include or ['*.yaml', '*.json']
+    exclude = exclude or []
+    if recursive:
+        found = []
+        for directory, dirnames, filenames in os.walk(path):
+            dirnames[:] = [name for name in dirnames
+                           if not name.startswith('.')]
+            relative = os.path.relpath(directory, path)
+            if relative == os.curdir:
+                relative = ''
+            found.extend(os.path.join(relative, name) for name in filenames)
+    else:
+        found = [name for name in os.listdir(path)
+                 if os.path.isfile(os.path.join(path, name))]
+
+    test_files = []
+    for test_file in found:
+        if os.path.basename(test_file).startswith('.'):
+            continue
+        name = test_file.replace(os.sep, '/')
+        if (any(fnmatch.fnmatchcase(name, pattern) for pattern in include)
+                and not any(fnmatch.fnmatchcase(name, pattern)
+                            for pattern in exclude)):
+            test_files.append(test_file)
+    return sorted(test_files)
+
+
+def _load_test_file(test_file, safe_yaml, cache_dir):
+    """Parse one test file.
+
+    A JSON file is only a suite if it is an object with a tests key.
+    Any other JSON is taken to be data used by the tests, and None is
+    returned. A file whose text is not an object naming a tests key is
+    not parsed, so data which is not valid JSON does not stop the
+    suites beside it from loading.
+    """
+    if not test_file.endswith('.json'):
+        return utils.load_yaml(yaml_file=test_file, safe=safe_yaml,
+                               cache_dir=cache_dir)
+    with io.open(test_file, encoding='utf-8') as source:
+        source = source.read()
+    if not (source.lstrip().startswith('{')
+            and _JSON_TESTS_KEY.search(source)):
+        return None
+    suite_dict = json.loads(source)
+    if isinstance(suite_dict, dict) and 'tests' in suite_dict:
+        return suite_dict
+    return None
+
+
+def _load_test_files(test_files, safe_yaml, cache_dir, load_workers):
+    """Yield the parsed contents of each of test_files, in order.
+
+    With more than one of load_workers the files are parsed in a pool of
+    processes. A file which fails to be parsed or returned from the pool
+    is parsed again in this process, so any error is raised just as it
+    is without the pool.
+    """
+    executor = None
+    if load_workers > 1 and len(test_files) > 1:
+        try:
+            executor = futures.ProcessPoolExecutor(
+                min(load_workers, len(test_files)))
+        except (NotImplementedError, OSError):
+            # Processes are not available on this platform.
+            pass
+
+    if executor is None:
+        for test_file in test_files:
+            yield _load_test_file(test_file, safe_yaml, cache_dir)
+        return
+
+    try:
+        loads = [executor.submit(_load_test_file, test_file, safe_yaml,
+                                 cache_dir)
+                 for test_file in test_files]
+        for test_file, load in zip(test_files, loads):
+            try:
+                suite_dict = load.result()
+            except Exception:
+                suite_dict = _load_test_file(test_file, safe_yaml,
+                                             cache_dir)
+            yield suite_dict
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def _tag_select(tags, select=None):
+    """Select tests with at least one of tags, and chosen by select."""
+    tags = {str(tag) for tag in tags}
+
+    def tag_select(test_name, test_tags):
+        return bool(tags & test_tags) and (
+            select is None or select(test_name, test_tags))
+    return tag_select
+
+
+def _name_pattern_select(patterns, test_loader_name):
+    """Select tests in the way unittest applies testNamePatterns.
+
+    Each pattern is matched against the full id of the test.
+    """
+    def select(test_name, test_tags):
+        full_name = '%s.%s.test_request' % (test_loader_name, test_name)
+        return any(fnmatch.fnmatchcase(full_name, pattern)
+                   for pattern in patterns)
+    return select
+
+
+def _keyword_select(metafunc, test_loader_name):
+    """Select tests with the keyword expression given to pytest -k.
+
+    The expression is evaluated against the names pytest will match
+    for each generated test, as pytest does after collection, so
+    files with no selected tests are not made. The files are still
+    parsed in full to find the names and tags of their tests.
+
+    pytest's expression evaluator is private. None is returned when
+    there is no expression or it cannot be used here, and a test is
+    kept if evaluating for it fails, leaving the selection to pytest.
+    """
+    keyword = metafunc.config.getoption('keyword', None)
+    if not keyword:
+        return None
+    evaluate = _expression_evaluator(keyword)
+    if evaluate is None:
+        return None
+
+    import pytest
+    definition = metafunc.definition
+    names = set()
+    for node in definition.listchain():
+        if isinstance(node, pytest.Session) or (
+                isinstance(node, pytest.Directory)
+                and isinstance(node.parent, pytest.Session)):
+            continue
+        names.add(node.name.lower())
+    names.update(name.lower() for name in definition.listextrakeywords())
+    names.update(name.lower() for name in definition.function.__dict__)
+    names.update(mark.name.lower() for mark in definition.iter_markers())
+
+    def select(test_name, test_tags):
+        item_name = '%s[%s:%s]' % (
+            definition.name, test_loader_name, test_name)
+        item_names = names | {item_name.lower()}
+        # Tags are markers, which are also keywords.
+        item_names.update(tag.lower() for tag in test_tags)
+
+        def matcher(subname, **kwargs):
+            subname = subname.lower()
+            return any(subname in name for name in item_names)
+        return evaluate(matcher)
+    return select
+
+
+def _marker_select(metafunc):
+    """Select tests with the marker expression given to pytest -m.
+
+    A test is marked with each of its tags. As with _keyword_select,
+    None is returned if the expression cannot be evaluated here.
+    """
+    markexpr = metafunc.config.getoption('markexpr', None)
+    if not markexpr:
+        return None
+    evaluate = _expression_evaluator(markexpr)
+    if evaluate is None:
+        return None
+
+    names = {mark.name for mark in metafunc.definition.iter_markers()}
+
+    def select(test_name, test_tags):
+        def matcher(name, **kwargs):
+            if kwargs:
+                # The expression matches on the arguments of markers.
+                raise ValueError(name)
+            return name in names or name in test_tags
+        return evaluate(matcher)
+    return select
+
+
+def _expression_evaluator(source):
+    """Compile a pytest -k or -m expression with pytest's private parser.
+
+    Return a function which evaluates the expression with a matcher, or
+    None if the parser is not there or does not work as expected. The
+    function returns True, so the test is kept for pytest to select, if
+    the evaluation fails.
+    """
+    try:
+        from _pytest.mark import expression
+        compiled = expression.Expression.compile(source)
+        # Make sure evaluate takes a matcher, as it does in the
+        # versions this was written for.
+        compiled.evaluate(lambda name, **kwargs: False)
+    except Exception:
+        return None
+
+    def evaluate(matcher):
+        try:
+            return bool(compiled.evaluate(matcher))
+        except Exception:
+            return True
+    return evaluate
+
+
+def _both_select(first, second):
+    """Select tests chosen by both first and second, either may be None."""
+    if first is None or second is None:
+        return first or second
+
+    def select(test_name, test_tags):
+        return (first(test_name, test_tags)
+                and second(test_name, test_tags))
+    return select
+
+
+def _test_marks(config, test, registered):
+    """Make a pytest mark for each tag of a test.
+
+    Tags not in registered are registered as markers and added to it.
+    """
+    import pytest
+    tags = test.test_data['tags']
+    if not isinstance(tags, list):
+        tags = [tags]
+    marks = []
+    for tag in tags:
+        tag = str(tag)
+        if tag not in registered:
+            config.addinivalue_line('markers', '%s: gabbi tag' % tag)
+            registered.add(tag)
+        marks.append(getattr(pytest.mark, tag))
+    return marks
+
+
 def py_test_generator(test_dir, host=None, port=8001, intercept=None,
                       prefix='', test_loader_name=None,
                       fixture_module=None, response_handlers=None,
                       content_handlers=None, require_ssl=False, url=None,
                       metafunc=None, use_prior_test=True,
-                      inner_fixtures=None, safe_yaml=True, cert_validate=True):
+                      inner_fixtures=None, safe_yaml=True, cert_validate=True,
+                      cache_dir=None, load_workers=None, recursive=False,
+                      include=None, exclude=None, tags=None, shard=None,
+                      timings=None):
     """Generate tests cases for py.test
 
     This uses build_tests to create TestCases and then yields them in
-    a way that pytest can handle.
+    a way that pytest can handle. Each test is marked with its tags, so
+    they may be selected with ``pytest -m``.
 
     test_loader_name is required!
     """
@@ -185,6 +522,10 @@ def py_test_generator(test_dir, host=None, port=8001, intercept=None,
 
     loader = unittest.TestLoader()
     result = reporter.PyTestResult()
+    select = None
+    if metafunc:
+        select = _both_select(_keyword_select(metafunc, test_loader_name),
+                              _marker_select(metafunc))
     tests = build_tests(test_dir, loader, host=host, port=port,
                         intercept=intercept,
                         test_loader_name=test_loader_name,
@@ -193,26 +534,30 @@ def py_test_generator(test_dir, host=None, port=8001, intercept=None,
                         content_handlers=content_handlers,
                         prefix=prefix, require_ssl=require_ssl,
                         url=url, use_prior_test=use_prior_test,
-                        safe_yaml=safe_yaml, cert_validate=cert_validate)
+                        safe_yaml=safe_yaml, cert_validate=cert_validate,
+                        cache_dir=cache_dir, select=select,
+                        load_workers=load_workers, recursive=recursive,
+                        include=include, exclude=exclude, tags=tags,
+                        shard=shard, timings=timings)
 
     test_list = []
     for test in tests:
         if hasattr(test, '_tests'):
             # Establish fixtures as if they were tests. These will
             # be cleaned up by the pytester plugin.
-            name = '%s:%s' % (test_loader_name,
-                              test._tests[0].__class__.__name__)
+            name = '%s:%s' % (test_loader_name, test._tests[0].test_name)
             test_list.append(('start_%s' % name, test.start, result))
             for subtest in test:
-                subname = '%s:%s' % (test_loader_name,
-                                     subtest.__class__.__name__)
+                subname = '%s:%s' % (test_loader_name, subtest.test_name)
                 test_list.append((subname, subtest, result))
             test_list.append(('stop_%s' % name, test.stop))
 
     if metafunc:
         if metafunc.function == test_pytest:
+            import pytest
             ids = []
             args = []
+            registered = set()
             for test in test_list:
                 if len(test) >= 3:
                     name, method, arg = test
@@ -220,7 +565,13 @@ def py_test_generator(test_dir, host=None, port=8001, intercept=None,
                     name, method = test
                     arg = None
                 ids.append(name)
-                args.append((method, arg))
+                if hasattr(method, 'test_data'):
+                    args.append(pytest.param(
+                        method, arg,
+                        marks=_test_marks(metafunc.config, method,
+                                          registered)))
+                else:
+                    args.append((method, arg))
 
             metafunc.parametrize("test, result", argvalues=args, ids=ids)
     else:
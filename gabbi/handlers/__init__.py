@@ -21,6 +21,15 @@ from gabbi.handlers import jsonhandler
 RESPONSE_HANDLERS = [
     core.ForbiddenHeadersResponseHandler,
     core.HeadersResponseHandler,
+    core.ResponseTimeHandler,
+    core.P50ResponseTimeHandler,
+    core.P95ResponseTimeHandler,
+    core.P99ResponseTimeHandler,
+    core.MaxResponseTimeHandler,
+    core.SHA256ResponseHandler,
+    core.MD5ResponseHandler,
+    core.LengthResponseHandler,
+    core.BytesResponseHandler,
     core.StringResponseHandler,
     jsonhandler.JSONHandler,
 ]
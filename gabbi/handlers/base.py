@@ -28,17 +28,31 @@ class ResponseHandler:
     ``action`` takes two or three arguments. If ``test_key_value`` is a list
     ``action`` is called with the test case and a single list item. If
     ``test_key_value`` is a dict then ``action`` is called with the test case
-    and a key and value pair.
+    and a key and value pair. If ``test_key_value`` is None the entry is a
+    single value, which ``action`` is called with unless it is None.
+
+    A subclass may also implement ``body_consumer`` to see the raw
+    response body.
+
+    ``reads_body`` is True if ``action`` uses the response body, as
+    ``test.output`` or ``test.response_data``. A test which sets
+    ``stream`` reads its response in full when such a handler has
+    something to check.
     """
 
     test_key_suffix = ''
     test_key_value = []
+    reads_body = True
 
     def __init__(self):
         self._register()
 
     def __call__(self, test):
-        if test.test_data[self._key]:
+        if self.test_key_value is None:
+            if test.test_data[self._key] is not None:
+                self.preprocess(test)
+                self.action(test, test.test_data[self._key])
+        elif test.test_data[self._key]:
             self.preprocess(test)
             if not isinstance(
                     test.test_data[self._key], type(self.test_key_value)):
@@ -57,6 +71,17 @@ class ResponseHandler:
         """Do any pre-single-test preprocessing."""
         pass
 
+    def body_consumer(self, test):
+        """Return a consumer of the raw response body, or None.
+
+        The consumer's ``feed`` method is called with the body, in
+        chunks as it arrives if the test sets ``stream``, otherwise all
+        at once. Its ``close`` method is then called and what it returns
+        is kept in the test's ``body_results``, keyed by this handler's
+        key, for use in ``action``.
+        """
+        return None
+
     def action(self, test, item, value=None):
         """Test an individual entry for this response handler.
 
@@ -96,7 +121,14 @@ class ResponseHandler:
 
 
 class ContentHandler(ResponseHandler):
-    """A subclass of ResponseHandlers that adds content handling."""
+    """A subclass of ResponseHandlers that adds content handling.
+
+    If ``loads_bytes`` is ``True`` the handler's ``loads`` is given the
+    raw response body when it is UTF-8 encoded, rather than a string
+    decoded from it.
+    """
+
+    loads_bytes = False
 
     @staticmethod
     def accepts(content_type):
@@ -116,6 +148,15 @@ class ContentHandler(ResponseHandler):
         """
         return data
 
+    def iterdumps(self, data, pretty=False, test=None):
+        """Yield structured data as a string in successive pieces.
+
+        This is used to show the start of a response in a failure
+        message without serializing all of it. The default yields the
+        result of ``dumps``.
+        """
+        yield self.dumps(data, pretty=pretty, test=test)
+
     @staticmethod
     def loads(data):
         """Create structured (Python) data from a stream.
@@ -129,3 +170,29 @@ class ContentHandler(ResponseHandler):
     def load_data_file(test, file_path):
         """Return the string content of the file specified by the file_path."""
         return test.load_data_file(file_path)
+
+    def stream_consumer(self, test):
+        """Return a consumer of the response body for a ``stream`` test.
+
+        The consumer's ``feed`` method is called with each chunk of the
+        body as it arrives and returns True when no more is needed. Its
+        ``close`` method is then called and returns the structured
+        response data. Return None to read the body in full instead.
+        """
+        return None
+
+
+class LazyMessage:
+    """A failure message which is formatted only when it is shown.
+
+    unittest assertions turn their ``msg`` into a string only when they
+    fail, so passing a ``LazyMessage`` as ``msg`` means an assertion
+    which passes does no formatting, however large its arguments.
+    """
+
+    def __init__(self, template, *args):
+        self.template = template
+        self.args = args
+
+    def __str__(self):
+        return self.template % self.args
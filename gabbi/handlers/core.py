@@ -12,6 +12,11 @@
 # under the License.
 """Core response handlers."""
 
+import functools
+import math
+import re
+
+from gabbi.exception import GabbiFormatError
 from gabbi.handlers import base
 
 
@@ -29,9 +34,9 @@ class StringResponseHandler(base.ResponseHandler):
             # Trim off /
             expected = expected[1:-1]
             test.assertRegex(
-                test.output, expected,
-                'Expect response body %s to match /%s/' %
-                (test.output, expected))
+                test.output, compile_regex(expected),
+                base.LazyMessage('Expect response body %s to match /%s/',
+                                 test.output, expected))
         else:
             test.assert_in_or_print_output(expected, test.output)
 
@@ -40,13 +45,16 @@ class ForbiddenHeadersResponseHandler(base.ResponseHandler):
     """Test that listed headers are not in the response."""
 
     test_key_suffix = 'forbidden_headers'
+    reads_body = False
     test_key_value = []
 
     def action(self, test, forbidden, value=None):
         # normalize forbidden header to lower case
         forbidden = test.replace_template(forbidden).lower()
         test.assertNotIn(forbidden, test.response,
-                         'Forbidden header %s found in response' % forbidden)
+                         base.LazyMessage(
+                             'Forbidden header %s found in response',
+                             forbidden))
 
 
 class HeadersResponseHandler(base.ResponseHandler):
@@ -59,6 +67,7 @@ class HeadersResponseHandler(base.ResponseHandler):
     """
 
     test_key_suffix = 'headers'
+    reads_body = False
     test_key_value = {}
 
     def action(self, test, header, value=None):
@@ -80,10 +89,281 @@ class HeadersResponseHandler(base.ResponseHandler):
         if is_regex:
             header_value = header_value[1:-1]
             test.assertRegex(
-                response_value, header_value,
-                'Expect header %s to match /%s/, got %s' %
-                (header, header_value, response_value))
+                response_value, compile_regex(header_value),
+                base.LazyMessage('Expect header %s to match /%s/, got %s',
+                                 header, header_value, response_value))
         else:
             test.assertEqual(header_value, response_value,
-                             'Expect header %s with value %s, got %s' %
-                             (header, header_value, response[header]))
+                             base.LazyMessage(
+                                 'Expect header %s with value %s, got %s',
+                                 header, header_value, response[header]))
+
+
+class ResponseTimeHandler(base.ResponseHandler):
+    """Fail a test whose response took longer than a budget.
+
+    Budgets, in seconds, may be set for the ``total`` time taken until
+    the response body has been read and for the ``ttfb``, the time
+    until the response headers arrived. A budget of ``null`` is not
+    checked, which allows a test to drop a budget set in the defaults.
+    """
+
+    test_key_suffix = 'time'
+    reads_body = False
+    test_key_value = {}
+    description = ''
+
+    def action(self, test, measure, value=None):
+        if measure not in ('total', 'ttfb'):
+            raise GabbiFormatError(
+                "%s in '%s' has unknown measure %s, must be total or ttfb"
+                % (self._key, test.test_data['name'], measure))
+        budget = test.replace_template(value)
+        if budget is None:
+            return
+        try:
+            budget = float(budget)
+        except (TypeError, ValueError):
+            raise GabbiFormatError(
+                "%s %s in '%s' must be a number of seconds, not %s"
+                % (self._key, measure, test.test_data['name'], budget))
+        elapsed = self.elapsed(test, measure)
+        if elapsed > budget:
+            raise AssertionError(
+                'Expect response %s%s time of at most %ss, got %.3fs'
+                % (self.description, measure, budget, elapsed))
+
+    def elapsed(self, test, measure):
+        """Return the time to compare with the budget."""
+        return test.response_timings[measure]
+
+
+class PercentileResponseTimeHandler(ResponseTimeHandler):
+    """Fail a test when a percentile of its response times is too long.
+
+    The times of all the requests made by a test which repeats its
+    request (see ``repeat`` and ``warmup``) are considered. The nearest
+    rank percentile is used.
+    """
+
+    percentile = 100
+
+    def elapsed(self, test, measure):
+        times = sorted(timings[measure] for timings in test.latencies)
+        rank = math.ceil(self.percentile / 100 * len(times))
+        return times[max(rank, 1) - 1]
+
+
+class P50ResponseTimeHandler(PercentileResponseTimeHandler):
+    """Fail a test when the median response time is too long."""
+
+    test_key_suffix = 'p50'
+    percentile = 50
+    description = 'p50 '
+
+
+class P95ResponseTimeHandler(PercentileResponseTimeHandler):
+    """Fail a test when the 95th percentile response time is too long."""
+
+    test_key_suffix = 'p95'
+    percentile = 95
+    description = 'p95 '
+
+
+class P99ResponseTimeHandler(PercentileResponseTimeHandler):
+    """Fail a test when the 99th percentile response time is too long."""
+
+    test_key_suffix = 'p99'
+    percentile = 99
+    description = 'p99 '
+
+
+class MaxResponseTimeHandler(PercentileResponseTimeHandler):
+    """Fail a test when the longest response time is too long."""
+
+    test_key_suffix = 'max'
+    percentile = 100
+    description = 'max '
+
+
+class DigestResponseHandler(base.ResponseHandler):
+    """Compare the hex digest of the response body with an expected one.
+
+    The digest is computed as the body is read, so when the test sets
+    ``stream`` the body need not be held in memory.
+    """
+
+    test_key_value = None
+    reads_body = False
+    algorithm = ''
+
+    def body_consumer(self, test):
+        if test.test_data[self._key] is None:
+            return None
+        return _Digest(self.algorithm)
+
+    def action(self, test, expected, value=None):
+        expected = str(test.replace_template(expected)).lower()
+        observed = test.body_results[self._key]
+        if expected != observed:
+            raise AssertionError('Expect response %s %s, got %s'
+                                 % (self.algorithm, expected, observed))
+
+
+class SHA256ResponseHandler(DigestResponseHandler):
+    """Compare the SHA-256 digest of the response body."""
+
+    test_key_suffix = 'sha256'
+    algorithm = 'sha256'
+
+
+class MD5ResponseHandler(DigestResponseHandler):
+    """Compare the MD5 digest of the response body."""
+
+    test_key_suffix = 'md5'
+    algorithm = 'md5'
+
+
+class LengthResponseHandler(base.ResponseHandler):
+    """Compare the length, in bytes, of the response body."""
+
+    test_key_suffix = 'length'
+    reads_body = False
+    test_key_value = None
+
+    def body_consumer(self, test):
+        if test.test_data[self._key] is None:
+            return None
+        return _Length()
+
+    def action(self, test, expected, value=None):
+        try:
+            expected = int(test.replace_template(expected))
+        except (TypeError, ValueError):
+            raise GabbiFormatError(
+                "%s in '%s' must be an integer, not %s"
+                % (self._key, test.test_data['name'], expected))
+        observed = test.body_results[self._key]
+        if expected != observed:
+            raise AssertionError('Expect response length %s, got %s'
+                                 % (expected, observed))
+
+
+class BytesResponseHandler(base.ResponseHandler):
+    """Compare ranges of bytes in the response body.
+
+    Keys are offsets into the body, negative offsets counting from its
+    end. Values are the bytes expected at the offset, as a hex string
+    such as ``89 50 4e 47`` or as YAML ``!!binary``. Only the bytes in
+    those ranges are kept while the body is read.
+    """
+
+    test_key_suffix = 'bytes'
+    reads_body = False
+    test_key_value = {}
+
+    def body_consumer(self, test):
+        ranges = test.test_data[self._key]
+        if not ranges or not isinstance(ranges, dict):
+            return None
+        return _ByteRanges([(self._offset(test, offset),
+                             len(self._expected(test, offset, expected)))
+                            for offset, expected in ranges.items()])
+
+    def action(self, test, offset, value=None):
+        start = self._offset(test, offset)
+        expected = self._expected(test, offset, value)
+        observed = test.body_results[self._key][start]
+        if expected != observed:
+            raise AssertionError(
+                'Expect response bytes at %s to be %s, got %s'
+                % (offset, expected.hex(' '), observed.hex(' ')))
+
+    def _offset(self, test, offset):
+        try:
+            return int(offset)
+        except (TypeError, ValueError):
+            raise GabbiFormatError(
+                "%s in '%s' has offset %s, must be an integer"
+                % (self._key, test.test_data['name'], offset))
+
+    def _expected(self, test, offset, expected):
+        expected = test.replace_template(expected)
+        if isinstance(expected, bytes):
+            return expected
+        try:
+            return bytes.fromhex(expected)
+        except (TypeError, ValueError):
+            raise GabbiFormatError(
+                "%s in '%s' at offset %s must be hex or binary, not %s"
+                % (self._key, test.test_data['name'], offset, expected))
+
+
+class _Digest:
+    """Hash a body as it is fed."""
+
+    def __init__(self, algorithm):
+        import hashlib
+        self.hash = hashlib.new(algorithm, usedforsecurity=False)
+
+    def feed(self, chunk):
+        self.hash.update(chunk)
+
+    def close(self):
+        return self.hash.hexdigest()
+
+
+class _Length:
+    """Count the bytes in a body as it is fed."""
+
+    def __init__(self):
+        self.length = 0
+
+    def feed(self, chunk):
+        self.length += len(chunk)
+
+    def close(self):
+        return self.length
+
+
+class _ByteRanges:
+    """Keep the bytes of a body within some (offset, length) ranges.
+
+    Negative offsets are served from a buffer of the end of the body.
+    """
+
+    def __init__(self, ranges):
+        self.ranges = ranges
+        self.found = {offset: bytearray() for offset, _ in ranges
+                      if offset >= 0}
+        self.tail_size = max([-offset for offset, _ in ranges] + [0])
+        self.tail = bytearray()
+        self.position = 0
+
+    def feed(self, chunk):
+        end = self.position + len(chunk)
+        for offset, length in self.ranges:
+            if offset >= 0 and offset < end and offset + length > (
+                    self.position):
+                self.found[offset] += chunk[
+                    max(offset - self.position, 0):
+                    offset + length - self.position]
+        self.position = end
+        if self.tail_size:
+            self.tail += chunk[-self.tail_size:]
+            del self.tail[:-self.tail_size]
+
+    def close(self):
+        found = {offset: bytes(data) for offset, data in self.found.items()}
+        for offset, length in self.ranges:
+            if offset < 0:
+                start = len(self.tail) + offset
+                found[offset] = bytes(
+                    self.tail[max(start, 0):max(start + length, 0)])
+        return found
+
+
+@functools.lru_cache(maxsize=256)
+def compile_regex(pattern):
+    """Compile a regular expression, reusing earlier compilations."""
+    return re.compile(pattern)
@@ -12,11 +12,75 @@
 # under the License.
 """JSON-related content handling."""
 
+import functools
+import importlib
 import json
+import os
+import re
+import reprlib
 
 from gabbi.exception import GabbiDataLoadError
 from gabbi.handlers import base
-import jsonpath_ng.ext as json_parser
+
+# jsonpath-ng, and the optional ijson and orjson, are imported where
+# they are used, so tests which do not use JSON, and gabbi-run when it
+# starts, do not pay for importing them.
+
+# The most differences reported when a JSONPath does not match.
+MAX_DIFFERENCES = 10
+
+_BRIEF = reprlib.Repr()
+_BRIEF.maxstring = _BRIEF.maxother = 80
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+@functools.lru_cache(maxsize=None)
+def optional_module(name):
+    """Import an optional module, returning None if it is missing."""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def _fast_loads(data):
+    """Decode JSON with orjson, falling back to the standard library.
+
+    orjson is stricter than the json module (it rejects NaN and
+    integers larger than 64 bits, for example) so anything it refuses
+    is given a second chance with json.loads.
+    """
+    orjson = optional_module('orjson')
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        return json.loads(data)
+
+
+def select_codec(name=None):
+    """Choose the function used to decode JSON.
+
+    If name is not provided, the ``GABBI_JSON_CODEC`` environment
+    variable is consulted. ``json`` forces the standard library,
+    otherwise orjson is used when it is installed.
+    """
+    name = name or os.environ.get('GABBI_JSON_CODEC', 'orjson')
+    if name == 'orjson' and optional_module('orjson') is not None:
+        return _fast_loads
+    return json.loads
+
+
+@functools.lru_cache(maxsize=None)
+def _codec():
+    return select_codec()
+
+
+def _loads(data):
+    """Decode JSON with the codec chosen by select_codec.
+
+    The choice is made, and orjson imported, on first use.
+    """
+    return _codec()(data)
 
 
 class JSONHandler(base.ContentHandler):
@@ -27,12 +91,22 @@ class JSONHandler(base.ContentHandler):
     * Response bodies that are JSON strings are made into Python
       data on the test ``response_data`` attribute when the response
       content-type is JSON.
-    * A ``response_json_paths`` response handler is added.
+    * A ``response_json_paths`` response handler is added. The left
+      hand side paths of a test are evaluated together, sharing the
+      traversal of common prefixes, before each is compared.
     * JSONPaths in $RESPONSE substitutions are supported.
+    * Equality filters on lists, such as ``$.items[?id = 3]``, are
+      answered from a hash index of the list built the first time it is
+      filtered on that field, unless ``use_filter_index`` is False.
+    * When a test sets ``stream``, and ijson is installed,
+      the paths are evaluated as the body arrives. See
+      :class:`JSONStream`.
     """
 
     test_key_suffix = 'json_paths'
     test_key_value = {}
+    loads_bytes = True
+    use_filter_index = True
 
     @staticmethod
     def accepts(content_type):
@@ -51,23 +125,32 @@ class JSONHandler(base.ContentHandler):
 
     @staticmethod
     def dumps(data, pretty=False, test=None):
+        if isinstance(data, StreamedJSON):
+            data = data.resolved()
         if pretty:
             return json.dumps(data, indent=2, separators=(',', ': '))
         else:
             return json.dumps(data)
 
+    def iterdumps(self, data, pretty=False, test=None):
+        if isinstance(data, StreamedJSON):
+            data = data.resolved()
+        if pretty:
+            encoder = json.JSONEncoder(indent=2, separators=(',', ': '))
+        else:
+            encoder = json.JSONEncoder()
+        return encoder.iterencode(data)
+
     @staticmethod
     def loads(data):
         try:
-            return json.loads(data)
+            return _loads(data)
         except ValueError as exc:
             raise GabbiDataLoadError('unable to parse data') from exc
 
     @staticmethod
     def load_data_file(test, file_path):
-        info = test.load_data_file(file_path)
-        info = str(info, 'UTF-8')
-        return json.loads(info)
+        return test.load_data_file(file_path, loads=_loads)
 
     @staticmethod
     def extract_json_path_value(data, path):
@@ -75,16 +158,50 @@ class JSONHandler(base.ContentHandler):
 
         The input data is a Python datastructure, not a JSON string.
         """
-        path_expr = json_parser.parse(path)
-        matches = [match.value for match in path_expr.find(data)]
-        if matches:
-            if len(matches) > 1:
-                return matches
-            else:
-                return matches[0]
+        if isinstance(data, StreamedJSON):
+            return data.extract(path)
+        path_expr = parse_json_path(path)
+        return _match_value(path_expr.find(data), data, path)
+
+    def preprocess(self, test):
+        """Find the matches of all the left hand side paths together."""
+        test.json_path_matches = {}
+        paths = test.test_data[self._key]
+        if not isinstance(paths, dict):
+            return
+        try:
+            data = test.response_data
+        except AttributeError:
+            return
+        if isinstance(data, StreamedJSON):
+            test.json_path_matches = dict(data.matches)
         else:
-            raise ValueError(
-                "JSONPath '%s' failed to match on data: '%s'" % (path, data))
+            test.json_path_matches = find_json_paths(
+                data, self._lhs_paths(test, paths),
+                filter_index=self.use_filter_index)
+
+    def stream_consumer(self, test):
+        """Evaluate the left hand side paths as the body arrives.
+
+        Without ijson the body is read in full.
+        """
+        paths = test.test_data.get(self._key)
+        if (optional_module('ijson') is None
+                or not isinstance(paths, dict)):
+            return None
+        return JSONStream(self._lhs_paths(test, paths),
+                          filter_index=self.use_filter_index)
+
+    @staticmethod
+    def _lhs_paths(test, paths):
+        lhs_paths = []
+        for path in paths:
+            try:
+                lhs_paths.append(test.replace_template(path))
+            except AssertionError:
+                # Reported when the path is checked.
+                continue
+        return lhs_paths
 
     def action(self, test, path, value=None):
         """Test json_paths against json data."""
@@ -92,13 +209,20 @@ class JSONHandler(base.ContentHandler):
         lhs_path = test.replace_template(path)
         rhs_path = rhs_match = None
         try:
-            lhs_match = self.extract_json_path_value(
-                test.response_data, lhs_path)
+            matches = getattr(test, 'json_path_matches', {}).get(lhs_path)
+            if matches is None:
+                lhs_match = self.extract_json_path_value(
+                    test.response_data, lhs_path)
+            elif isinstance(matches, Exception):
+                raise matches
+            else:
+                lhs_match = _match_value(matches, test.response_data,
+                                         lhs_path)
         except AttributeError:
             raise AssertionError('unable to extract JSON from test results')
         except ValueError:
             raise AssertionError('left hand side json path %s cannot match '
-                                 '%s' % (path, test.response_data))
+                                 '%s' % (path, _brief(test.response_data)))
 
         # read data from disk if the value starts with '<@'
         if isinstance(value, str) and value.startswith('<@'):
@@ -114,8 +238,9 @@ class JSONHandler(base.ContentHandler):
                     raise AssertionError('unable to extract JSON from data on '
                                          'disk')
                 except ValueError:
-                    raise AssertionError('right hand side json path %s cannot '
-                                         'match %s' % (rhs_path, value))
+                    raise AssertionError(
+                        'right hand side json path %s cannot match %s'
+                        % (rhs_path, _brief(value)))
 
         # If expected is a string, check to see if it is a regex.
         is_regex = isinstance(value, str) and self.is_regex(value)
@@ -128,9 +253,492 @@ class JSONHandler(base.ContentHandler):
             match = str(match)
             test.assertRegex(
                 match, expected,
-                'Expect jsonpath %s to match /%s/, got %s' %
-                (path, expected, match))
+                base.LazyMessage('Expect jsonpath %s to match /%s/, got %s',
+                                 path, expected, match))
+        elif expected != match:
+            differences = json_differences(expected, match, lhs_path)
+            raise AssertionError('\n'.join(
+                ['Unable to match %s as %s, got %s' %
+                 (path, _brief(expected), _brief(match))] + differences))
+
+
+@functools.lru_cache(maxsize=512)
+def parse_json_path(path):
+    """Parse a JSONPath, reusing earlier parses of the same path."""
+    import jsonpath_ng.ext as json_parser
+    return json_parser.parse(path)
+
+
+def find_json_paths(data, paths, filter_index=True):
+    """Find the matches of several JSONPaths in data together.
+
+    Each path is split into the steps it is made of and the paths are
+    arranged in a tree in which paths with the same leading steps share
+    a branch, so those steps are taken once for all of them. If
+    filter_index is True, equality filters use a FilterIndex.
+
+    Return a dict of the list of matches for each path or, if parsing
+    or following the path raised an exception, that exception.
+    """
+    results = {}
+    indexes = FilterIndex() if filter_index else None
+    # A node in the tree is a dict of (step, node) pairs, keyed by
+    # _step_key, and a list of the paths which end at the node.
+    tree = ({}, [])
+    for path in paths:
+        try:
+            steps = _json_path_steps(parse_json_path(path))
+        except Exception as exc:
+            results[path] = exc
+            continue
+        node = tree
+        for step in steps:
+            node = node[0].setdefault(_step_key(step), (step, ({}, [])))[1]
+        node[1].append(path)
+
+    # The matches are None at the root, before the first step.
+    pending = [(tree, None)]
+    while pending:
+        (children, ended), matches = pending.pop()
+        for path in ended:
+            results[path] = matches
+        for step, child in children.values():
+            try:
+                if matches is None:
+                    found = step.find(data)
+                else:
+                    found = _follow_step(step, matches, indexes)
+            except Exception as exc:
+                _set_results(results, child, exc)
+                continue
+            pending.append((child, found))
+    return results
+
+
+def _step_key(step):
+    """Make a key which is the same only for steps that match the same.
+
+    Steps are not compared with ==, as jsonpath-ng compares filter values
+    with == and 1, 1.0 and True are equal, but do not filter the same.
+    """
+    return (type(step), str(step),
+            tuple(type(getattr(expression, 'value', None))
+                  for expression in getattr(step, 'expressions', ())))
+
+
+def _follow_step(step, matches, indexes=None):
+    """Find the matches of one step of a path from earlier matches."""
+    from jsonpath_ng import jsonpath
+    find = step.find
+    if indexes is not None and indexes.accepts(step):
+        find = functools.partial(indexes.find, step)
+    # As jsonpath.Child, auto ids have no children.
+    return [match for datum in matches
+            if not isinstance(datum, jsonpath.AutoIdForDatum)
+            for match in find(datum)]
+
+
+class FilterIndex:
+    """Hash indexes of lists for filters which test for equality.
+
+    A filter such as ``[?id = 3]`` is answered by looking 3 up in an
+    index of the values of ``id`` in the list's items. The index is
+    built the first time the list is filtered on ``id`` and reused for
+    later filters, whatever value they look for. The matches are those
+    jsonpath-ng would find, in the same order.
+
+    Lists are identified by id, so an index must not outlive the data
+    it was built from.
+    """
+
+    def __init__(self):
+        self._indexes = {}
+
+    @staticmethod
+    def accepts(step):
+        """Report if the step is a filter which can use an index."""
+        from jsonpath_ng.ext import filter as jsonpath_filter
+        if not (isinstance(step, jsonpath_filter.Filter)
+                and len(step.expressions) == 1):
+            return False
+        expression = step.expressions[0]
+        if not (isinstance(expression, jsonpath_filter.Expression)
+                and expression.op in ('=', '==')):
+            return False
+        try:
+            hash(expression.value)
+        except TypeError:
+            return False
+        return True
+
+    def find(self, step, datum):
+        """Find the matches of the filter step in datum."""
+        from jsonpath_ng import jsonpath
+        datum = jsonpath.DatumInContext.wrap(datum)
+        items = datum.value
+        if not isinstance(items, list):
+            return step.find(datum)
+        expression = step.expressions[0]
+        values, numbers = self._index(items, expression.target)
+        positions = values.get(expression.value, [])
+        if type(expression.value) is int:
+            # As jsonpath-ng, strings are compared as integers.
+            positions = sorted(
+                set(positions).union(numbers.get(expression.value, [])))
+        return [jsonpath.DatumInContext(
+                    items[position], path=jsonpath.Index(position),
+                    context=datum)
+                for position in positions]
+
+    def _index(self, items, target):
+        """Return the index of the values of target in items."""
+        from jsonpath_ng import jsonpath
+        indexes = self._indexes.setdefault(id(items), [])
+        for indexed_target, index in indexes:
+            if indexed_target == target:
+                return index
+        values = {}
+        numbers = {}
+        for position, item in enumerate(items):
+            for match in target.find(jsonpath.DatumInContext.wrap(item)):
+                value = match.value
+                try:
+                    positions = values.setdefault(value, [])
+                except TypeError:
+                    # Unhashable values are never equal to a filter's.
+                    pass
+                else:
+                    if not positions or positions[-1] != position:
+                        positions.append(position)
+                if isinstance(value, str):
+                    try:
+                        positions = numbers.setdefault(int(value), [])
+                    except ValueError:
+                        continue
+                    if not positions or positions[-1] != position:
+                        positions.append(position)
+        indexes.append((target, (values, numbers)))
+        return values, numbers
+
+
+def _json_path_steps(path_expr):
+    """Split a parsed JSONPath into its successive steps."""
+    from jsonpath_ng import jsonpath
+    steps = []
+    pending = [path_expr]
+    while pending:
+        expr = pending.pop()
+        if isinstance(expr, jsonpath.Child):
+            pending.append(expr.right)
+            pending.append(expr.left)
+        else:
+            steps.append(expr)
+    return steps
+
+
+def _set_results(results, node, result):
+    """Set the result of every path ending at or below node."""
+    pending = [node]
+    while pending:
+        children, ended = pending.pop()
+        for path in ended:
+            results[path] = result
+        pending.extend(child for _, child in children.values())
+
+
+def _match_value(matches, data, path):
+    """Turn the matches of path into the value to compare."""
+    values = [match.value for match in matches]
+    if values:
+        if len(values) > 1:
+            return values
+        else:
+            return values[0]
+    else:
+        raise ValueError(base.LazyMessage(
+            "JSONPath '%s' failed to match on data: '%s'", path, data))
+
+
+def json_differences(expected, observed, path='$',
+                     limit=MAX_DIFFERENCES):
+    """List the differences between two JSON structures.
+
+    Each difference is described with the JSONPath, below path, at
+    which it is found, for example ``$.items[123].price: 5 != 6``.
+    Structures are walked in document order, skipping equal values,
+    and the walk stops when limit differences have been found.
+    """
+    differences = []
+    pending = [(path, expected, observed)]
+    while pending and len(differences) < limit:
+        path, expected, observed = pending.pop()
+        if isinstance(expected, dict) and isinstance(observed, dict):
+            children = []
+            for key, value in expected.items():
+                child = _child_path(path, key)
+                if key in observed:
+                    if value != observed[key]:
+                        children.append((child, value, observed[key]))
+                else:
+                    differences.append('%s: expected %s, missing' %
+                                       (child, _BRIEF.repr(value)))
+            for key, value in observed.items():
+                if key not in expected:
+                    differences.append('%s: unexpected %s' % (
+                        _child_path(path, key), _BRIEF.repr(value)))
+            pending.extend(reversed(children))
+        elif isinstance(expected, list) and isinstance(observed, list):
+            if len(expected) != len(observed):
+                differences.append('%s: expected %d items, got %d' %
+                                   (path, len(expected), len(observed)))
+            pending.extend(
+                ('%s[%d]' % (path, index), expected[index], observed[index])
+                for index in reversed(
+                    range(min(len(expected), len(observed))))
+                if expected[index] != observed[index])
+        elif expected != observed:
+            differences.append('%s: %s != %s' % (
+                path, _BRIEF.repr(expected), _BRIEF.repr(observed)))
+    if pending or len(differences) > limit:
+        differences = differences[:limit]
+        differences.append('... stopped after %d differences' % limit)
+    return differences
+
+
+def _child_path(path, key):
+    """Return the JSONPath of a key within the object at path."""
+    if isinstance(key, str) and _IDENTIFIER.match(key):
+        return '%s.%s' % (path, key)
+    return '%s[%s]' % (path, json.dumps(key))
+
+
+def _brief(value):
+    """Return a bounded form of value for a failure message."""
+    if isinstance(value, str):
+        return _BRIEF.repr(value)[1:-1] if len(value) > 80 else value
+    return _BRIEF.repr(value)
+
+
+class StreamedJSON:
+    """The matches of the JSONPaths evaluated while a response streamed.
+
+    This is the response data of a test which streams its response.
+    Only those paths can be extracted from it.
+    """
+
+    def __init__(self, matches):
+        self.matches = matches
+
+    def extract(self, path):
+        try:
+            matches = self.matches[path]
+        except KeyError:
+            raise ValueError(
+                "JSONPath '%s' was not evaluated while streaming" % path)
+        if isinstance(matches, Exception):
+            raise matches
+        return _match_value(matches, self, path)
+
+    def resolved(self):
+        """Return the value of each path which matched."""
+        values = {}
+        for path in self.matches:
+            try:
+                values[path] = self.extract(path)
+            except Exception:
+                continue
+        return values
+
+    def __repr__(self):
+        return repr(self.resolved())
+
+
+class JSONStream:
+    """Consume a JSON document as it arrives, keeping what paths need.
+
+    Each path starts with a run of plain field names and list indexes
+    (as in ``$.items[3].name``), which locates one part of the document,
+    followed by any other steps. Only the located parts are built into
+    Python data and the remaining steps are followed within them. Once
+    every part has been found, or cannot be present, the rest of the
+    document is not needed and ``feed`` returns True.
+    """
+
+    def __init__(self, paths, filter_index=True):
+        self.filter_index = filter_index
+        self.paths = {}
+        for path in paths:
+            try:
+                self.paths[path] = _split_json_path(parse_json_path(path))
+            except Exception as exc:
+                self.paths[path] = exc
+        locations = {split[0] for split in self.paths.values()
+                     if not isinstance(split, Exception)}
+        # A part within another part is found in the outer part.
+        self._wanted = {
+            location for location in locations
+            if not any(location[:len(other)] == other
+                       for other in locations if other != location)}
+        self._missing = set(self._wanted)
+        self._parts = {}
+        # The containers being descended, each a list of its kind and
+        # the current key or index.
+        self._stack = []
+        self._depth = 0
+        self._builder = None
+        self._location = None
+        self._fed = False
+        self._error = None
+        ijson = optional_module('ijson')
+        self._events = ijson.sendable_list()
+        self._parser = ijson.basic_parse_coro(self._events, use_float=True)
+
+    def feed(self, chunk):
+        """Parse a chunk of the document, return True if done."""
+        if self._error is None and self._missing:
+            self._fed = self._fed or bool(chunk)
+            try:
+                self._parser.send(chunk)
+            except Exception as exc:
+                self._error = exc
+            self._handle_events()
+        return self._error is not None or not self._missing
+
+    def close(self):
+        """Return the response data once the document is consumed."""
+        from jsonpath_ng import jsonpath
+        if not self._fed:
+            return None
+        if self._error is None and self._missing:
+            try:
+                self._parser.close()
+            except Exception as exc:
+                self._error = exc
+            self._handle_events()
+        if self._error is not None:
+            raise GabbiDataLoadError('unable to parse data') from self._error
+
+        matches = {}
+        indexes = FilterIndex() if self.filter_index else None
+        for path, split in self.paths.items():
+            if isinstance(split, Exception):
+                matches[path] = split
+                continue
+            location, steps = split
+            for wanted in self._wanted:
+                if location[:len(wanted)] == wanted:
+                    break
+            if wanted not in self._parts:
+                matches[path] = []
+                continue
+            found = [jsonpath.DatumInContext(self._parts[wanted])]
+            try:
+                for step in steps[len(wanted):]:
+                    found = _follow_step(step, found, indexes)
+            except Exception as exc:
+                found = exc
+            matches[path] = found
+        return StreamedJSON(matches)
+
+    def _handle_events(self):
+        for event, value in self._events:
+            self._handle_event(event, value)
+            if not self._missing:
+                break
+        del self._events[:]
+
+    def _handle_event(self, event, value):
+        starts = event in ('start_map', 'start_array')
+        ends = event in ('end_map', 'end_array')
+        if self._depth:
+            # Within a part being built or skipped.
+            self._depth += starts - ends
+            if self._builder is not None:
+                self._builder.event(event, value)
+                if not self._depth:
+                    self._found(self._builder.value)
+            return
+
+        if event == 'map_key':
+            self._stack[-1][1] = value
+            return
+        if ends:
+            self._stack.pop()
+            # Nothing more can be found within the container.
+            self._drop_missing(tuple(frame[1] for frame in self._stack))
+            return
+
+        # A value starts.
+        if self._stack and self._stack[-1][0] == 'array':
+            self._stack[-1][1] += 1
+        location = tuple(frame[1] for frame in self._stack)
+        if location in self._missing:
+            self._location = location
+            self._builder = optional_module('ijson.common').ObjectBuilder()
+            self._builder.event(event, value)
+            self._depth = int(starts)
+            if not starts:
+                self._found(self._builder.value)
+        elif any(missing[:len(location)] == location
+                 for missing in self._missing):
+            if event == 'start_map':
+                self._stack.append(['map', None])
+            elif event == 'start_array':
+                self._stack.append(['array', -1])
+            else:
+                self._drop_missing(location)
         else:
-            test.assertEqual(expected, match,
-                             'Unable to match %s as %s, got %s' %
-                             (path, expected, match))
+            self._depth = int(starts)
+
+    def _found(self, value):
+        self._parts[self._location] = value
+        self._missing.discard(self._location)
+        self._builder = None
+
+    def _drop_missing(self, location):
+        """Stop looking for parts within location."""
+        self._missing = {missing for missing in self._missing
+                         if missing[:len(location)] != location}
+
+
+def _split_json_path(path_expr):
+    """Split a parsed JSONPath into the location of a part and steps.
+
+    The location is the keys and indexes of the plain steps at the
+    start of the path. The steps are all the steps of the path, after
+    the root.
+    """
+    from jsonpath_ng import jsonpath
+    steps = _json_path_steps(path_expr)
+    if steps and isinstance(steps[0], jsonpath.Root):
+        steps = steps[1:]
+    location = []
+    for step in steps:
+        if (isinstance(step, jsonpath.Fields) and len(step.fields) == 1
+                and step.fields[0] != '*'):
+            location.append(step.fields[0])
+        elif (isinstance(step, jsonpath.Index) and len(step.indices) == 1
+                and step.indices[0] >= 0):
+            location.append(step.indices[0])
+        else:
+            break
+    if _uses_context(steps[len(location):]):
+        # The steps look outside the part, so the whole document is
+        # needed.
+        location = []
+    return tuple(location), steps
+
+
+def _uses_context(steps):
+    """Report if any of the steps refers to the root or a parent."""
+    from jsonpath_ng import jsonpath
+    pending = list(steps)
+    while pending:
+        item = pending.pop()
+        if isinstance(item, (jsonpath.Root, jsonpath.Parent)):
+            return True
+        if isinstance(item, (list, tuple)):
+            pending.extend(item)
+        elif isinstance(item, jsonpath.JSONPath):
+            pending.extend(vars(item).values())
+    return False
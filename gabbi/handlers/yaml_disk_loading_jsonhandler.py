@@ -33,6 +33,8 @@ class YAMLDiskLoadingJSONHandler(jsonhandler.JSONHandler):
 
     @staticmethod
     def load_data_file(test, file_path):
-        info = test.load_data_file(file_path)
-        info = str(info, 'UTF-8')
-        return yaml.safe_load(info)
+        return test.load_data_file(file_path, loads=_yaml_loads)
+
+
+def _yaml_loads(info):
+    return yaml.safe_load(str(info, 'UTF-8'))
@@ -11,9 +11,11 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import functools
 import logging
 import os
 import sys
+import time
 
 import httpx
 
@@ -23,6 +25,15 @@ from gabbi import utils
 logging.getLogger('httpx').setLevel(logging.WARNING)
 
 
+@functools.lru_cache(maxsize=2)
+def ssl_context(cert_validate=True):
+    """Return an SSL context for clients.
+
+    Making one is slow, so one is shared by all clients.
+    """
+    return httpx.create_ssl_context(verify=cert_validate)
+
+
 class Http:
     """A class to munge the HTTP response.
 
@@ -41,24 +52,40 @@ class Http:
             )
         version = int(kwargs.get("version", 1))
         self.client = httpx.Client(
-            transport=transport, verify=kwargs.get("cert_validate", True),
+            transport=transport,
+            verify=ssl_context(kwargs.get("cert_validate", True)),
             http1=(version == 1), http2=(version == 2),
+            cookies=kwargs.get('cookies'),
         )
 
-    def request(self, absolute_uri, method, body, headers, redirect, timeout):
-        response = self.client.request(
+    def request(self, absolute_uri, method, body, headers, redirect, timeout,
+                stream=None, timings=None):
+        """Make a request, returning the response headers and content.
+
+        If stream is provided it is called with the response headers
+        before the body is read. If it returns a consumer, the body is
+        passed to the consumer's ``feed`` method as it arrives, rather
+        than returned, until ``feed`` returns True or the body ends.
+
+        If timings, a dict, is provided the seconds taken until the
+        response headers arrived (``ttfb``) and until the body had been
+        read (``total``) are set in it.
+        """
+        request = self.client.build_request(
             method=method,
             url=absolute_uri,
             headers=headers,
             content=body,
             timeout=timeout,
-            follow_redirects=redirect,
             extensions=self.extensions,
         )
+        start = time.perf_counter()
+        response = self.client.send(
+            request, follow_redirects=redirect, stream=True)
+        ttfb = time.perf_counter() - start
 
         # Transform response into something akin to httplib2
         # response object.
-        content = response.content
         status = response.status_code
         reason = response.reason_phrase
         http_version = response.http_version
@@ -67,6 +94,22 @@ class Http:
         headers['reason'] = str(reason)
         headers['http_protocol_version'] = str(http_version)
 
+        try:
+            consumer = stream(headers) if stream else None
+            if consumer is None:
+                content = response.read()
+            else:
+                content = b''
+                for chunk in response.iter_bytes():
+                    if consumer.feed(chunk):
+                        break
+        finally:
+            response.close()
+
+        if timings is not None:
+            timings['ttfb'] = ttfb
+            timings['total'] = time.perf_counter() - start
+
         return headers, content
 
 
@@ -118,7 +161,8 @@ class VerboseHttp(Http):
             self.colorize = utils.get_colorizer(self._stream)
         super().__init__(**kwargs)
 
-    def request(self, absolute_uri, method, body, headers, redirect, timeout):
+    def request(self, absolute_uri, method, body, headers, redirect, timeout,
+                stream=None, timings=None):
         """Display request parameters before requesting."""
 
         self._verbose_output(f'#### {self.caption} ####',
@@ -131,7 +175,8 @@ class VerboseHttp(Http):
         self._print_body(headers, body)
 
         response, content = super().request(
-            absolute_uri, method, body, headers, redirect, timeout)
+            absolute_uri, method, body, headers, redirect, timeout,
+            stream=stream, timings=timings)
 
         # Blank line for division
         self._verbose_output('')
@@ -204,8 +249,13 @@ def get_http(
     prefix='',
     timeout=30,
     version=1,
+    cookies=None,
 ):
-    """Return an ``Http`` class for making requests."""
+    """Return an ``Http`` class for making requests.
+
+    If cookies, a ``http.cookiejar.CookieJar``, is provided, cookies
+    from responses are stored in it and sent with later requests.
+    """
     if not verbose:
         return Http(
             server_hostname=hostname,
@@ -214,6 +264,7 @@ def get_http(
             intercept=intercept,
             prefix=prefix,
             version=version,
+            cookies=cookies,
         )
 
     headers = verbose != 'body'
@@ -231,4 +282,5 @@ def get_http(
         intercept=intercept,
         prefix=prefix,
         version=version,
+        cookies=cookies,
     )
@@ -17,8 +17,6 @@ from unittest import TestResult
 from unittest import TextTestResult
 from unittest import TextTestRunner
 
-import pytest
-
 from gabbi import utils
 
 
@@ -111,6 +109,9 @@ class PyTestResult(TestResult):
 
     * to turn what had been exceptions back into exceptions
     * use pytest's skip and xfail methods
+
+    pytest is imported only when it is used, so gabbi-run, which
+    shares this module, does not pay for importing it.
     """
 
     def addFailure(self, test, err):
@@ -120,9 +121,11 @@ class PyTestResult(TestResult):
         raise err[1]
 
     def addSkip(self, test, reason):
+        import pytest
         pytest.skip(reason)
 
     def addExpectedFailure(self, test, err):
+        import pytest
         pytest.xfail('%s' % err[1])
 
 
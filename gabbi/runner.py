@@ -16,6 +16,7 @@ import argparse
 from importlib import import_module
 import os
 import sys
+import time
 import unittest
 
 from gabbi import handlers
@@ -69,6 +70,22 @@ def run():
     Output is formatted as unittest summary information. Use `-q` or
     `--quiet` to silence that output.
 
+    Use `--cache-dir` to keep parsed YAML in a directory, for use again
+    while it is unchanged.
+
+    Use `--tags` with a comma separated list of tags to run only the tests
+    with at least one of them (and the tests they follow)::
+
+        gabbi-run --tags smoke,fast example.com -- /path/to/x.yaml
+
+    Use `--shard INDEX/COUNT` to run only the files in one of COUNT shards,
+    counting from 1, so the files can be split across several machines.
+    With `--timings` naming a JSON file, the time each file takes is saved
+    in it, keyed by the path of the file relative to the JSON file, and
+    used to balance the shards of later runs::
+
+        gabbi-run --shard 2/4 --timings times.json example.com -- *.yaml
+
     Use ``-r`` or ``--response-handler`` to load a custom response or content
     handler for use with tests.
 
@@ -99,16 +116,41 @@ def run():
     # Keep track of file names that have failures.
     failures = []
 
+    if args.shard:
+        if not input_files:
+            parser.error('--shard requires files to be named after --')
+        index, count = args.shard
+        if args.timings:
+            names = [utils.timings_key(input_file, args.timings)
+                     for input_file in input_files]
+            chosen = set(utils.shard_files(
+                names, index, count, utils.load_timings(args.timings)))
+            input_files = [input_file for input_file, name
+                           in zip(input_files, names) if name in chosen]
+        else:
+            input_files = utils.shard_files(input_files, index, count)
+    timings = {}
+
     if not input_files:
-        success = run_suite(sys.stdin, handler_objects, host, port,
-                            prefix, force_ssl, failfast,
-                            verbosity=verbosity,
-                            safe_yaml=args.safe_yaml, quiet=quiet,
-                            cert_validate=cert_validate)
-        failure = not success
+        # Each document on STDIN is run as soon as it is read, so that
+        # a producer may stream suites to one long running process.
+        documents = utils.load_documents(
+            sys.stdin, safe=args.safe_yaml, cache_dir=args.cache_dir)
+        for number, data in enumerate(documents, 1):
+            name = 'input' if number == 1 else 'input-%s' % number
+            success = run_data(data, handler_objects, host, port,
+                               prefix, force_ssl, failfast,
+                               verbosity=verbosity, name=name,
+                               quiet=quiet, cert_validate=cert_validate,
+                               tags=args.tags)
+            if not success:
+                failure = True
+                if failfast:
+                    break
     else:
         for input_file in input_files:
             name = os.path.splitext(os.path.basename(input_file))[0]
+            start = time.perf_counter()
             with open(input_file, 'r') as fh:
                 data_dir = os.path.dirname(input_file)
                 success = run_suite(fh, handler_objects, host, port,
@@ -117,7 +159,12 @@ def run():
                                     verbosity=verbosity, name=name,
                                     safe_yaml=args.safe_yaml,
                                     quiet=quiet,
-                                    cert_validate=cert_validate)
+                                    cert_validate=cert_validate,
+                                    cache_dir=args.cache_dir,
+                                    tags=args.tags)
+            if args.timings:
+                timings[utils.timings_key(input_file, args.timings)] = round(
+                    time.perf_counter() - start, 3)
             if not success:
                 failures.append(input_file)
             if not failure:  # once failed, this is considered immutable
@@ -125,6 +172,9 @@ def run():
             if failure and failfast:
                 break
 
+    if args.timings and timings:
+        utils.save_timings(args.timings, timings)
+
     if failures:
         print("There were failures in the following files:", file=sys.stderr)
         print('\n'.join(failures), file=sys.stderr)
@@ -133,9 +183,29 @@ def run():
 
 def run_suite(handle, handler_objects, host, port, prefix, force_ssl=False,
               failfast=False, data_dir='.', verbosity=False, name='input',
-              safe_yaml=True, quiet=False, cert_validate=True):
-    """Run the tests from the YAML in handle."""
-    data = utils.load_yaml(handle, safe=safe_yaml)
+              safe_yaml=True, quiet=False, cert_validate=True,
+              cache_dir=None, tags=None):
+    """Run the tests from the YAML in handle.
+
+    If tags are given, only the tests with at least one of them, and
+    those they follow, are made and run.
+    """
+    data = utils.load_yaml(handle, safe=safe_yaml, cache_dir=cache_dir)
+    return run_data(data, handler_objects, host, port, prefix,
+                    force_ssl=force_ssl, failfast=failfast,
+                    data_dir=data_dir, verbosity=verbosity, name=name,
+                    quiet=quiet, cert_validate=cert_validate, tags=tags)
+
+
+def run_data(data, handler_objects, host, port, prefix, force_ssl=False,
+             failfast=False, data_dir='.', verbosity=False, name='input',
+             quiet=False, cert_validate=True, tags=None):
+    """Run the tests from data, a suite that has already been parsed."""
+    selected = None
+    if tags:
+        tags = {str(tag) for tag in tags}
+        selected = suitemaker.select_tests(
+            name, data, lambda test_name, test_tags: bool(tags & test_tags))
     if force_ssl:
         if 'defaults' in data:
             data['defaults']['ssl'] = True
@@ -155,7 +225,8 @@ def run_suite(handle, handler_objects, host, port, prefix, force_ssl=False,
     loader = unittest.defaultTestLoader
     test_suite = suitemaker.test_suite_from_dict(
         loader, name, data, data_dir, host, port, None, None, prefix=prefix,
-        handlers=handler_objects, test_loader_name='gabbi-runner')
+        handlers=handler_objects, test_loader_name='gabbi-runner',
+        select=selected)
 
     # The default runner stream is stderr.
     stream = sys.stderr
@@ -283,6 +354,33 @@ def _make_argparser():
         default=True,
         help='Turn off ssl certificate validation.'
     )
+    parser.add_argument(
+        '--cache-dir',
+        dest='cache_dir',
+        default=os.environ.get('GABBI_CACHE_DIR'),
+        help='Keep parsed YAML in this directory, to reuse while it is '
+             'unchanged. Defaults to GABBI_CACHE_DIR.'
+    )
+    parser.add_argument(
+        '--tags',
+        type=lambda tags: [tag for tag in tags.split(',') if tag],
+        default=None,
+        help='Run only the tests with at least one of these comma '
+             'separated tags.'
+    )
+    parser.add_argument(
+        '--shard',
+        type=_shard,
+        default=None,
+        help='Run only the files in this shard, INDEX/COUNT, counting '
+             'from 1.'
+    )
+    parser.add_argument(
+        '--timings',
+        default=None,
+        help='A JSON file in which to save the time each file takes to '
+             'run, and from which to read them to balance shards.'
+    )
     parser.add_argument(
         '--unsafe-yaml',
         dest='safe_yaml',
@@ -294,5 +392,13 @@ def _make_argparser():
     return parser
 
 
+def _shard(shard):
+    """Parse a --shard argument."""
+    try:
+        return utils.parse_shard(shard)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(str(exc))
+
+
 if __name__ == '__main__':
     run()
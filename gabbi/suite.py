@@ -13,10 +13,13 @@
 """A TestSuite for containing gabbi tests.
 
 This suite has two features: the contained tests are ordered and there
-are suite-level fixtures that operate as context managers.
+are suite-level fixtures that operate as context managers. When a suite
+sets a concurrency, tests which do not depend on each other run at the
+same time.
 """
 
 import sys
+import threading
 import unittest
 
 from gabbi import fixture
@@ -37,6 +40,9 @@ class GabbiSuite(unittest.TestSuite):
     tests in this suite will be skipped.
     """
 
+    # The number of tests which may run at the same time.
+    concurrency = 1
+
     def run(self, result, debug=False):
         """Override TestSuite run to start suite-level fixtures.
 
@@ -48,7 +54,10 @@ class GabbiSuite(unittest.TestSuite):
 
         try:
             with fixture.nest([fix() for fix in fixtures]):
-                result = super(GabbiSuite, self).run(result, debug)
+                if self.concurrency > 1 and not debug:
+                    result = self._run_concurrently(result)
+                else:
+                    result = super(GabbiSuite, self).run(result, debug)
         except unittest.SkipTest as exc:
             for test in self._tests:
                 result.addSkip(test, str(exc))
@@ -75,6 +84,49 @@ class GabbiSuite(unittest.TestSuite):
 
         return result
 
+    def _run_concurrently(self, result):
+        """Run the tests in a pool of threads.
+
+        Each test waits for the tests it depends on (see
+        gabbi.suitemaker). Tests are submitted in suite order, and depend
+        only on earlier tests, so a waiting test never holds up one it
+        waits for. What each test reports is recorded and then passed to
+        result as a whole so the output of tests is not interleaved.
+        """
+        from concurrent import futures
+        lock = threading.Lock()
+        submitted = {}
+
+        def run_test(test, waits, test_result):
+            for wait in waits:
+                wait.result()
+            if result.shouldStop:
+                return
+            recorder = _RecordingResult(test_result)
+            test(recorder)
+            with lock:
+                recorder.replay()
+
+        def submit(test, test_result):
+            if test not in submitted:
+                waits = [submit(dependency, unittest.TestResult())
+                         for dependency in test.dependencies or []]
+                submitted[test] = executor.submit(
+                    run_test, test, waits, test_result)
+            return submitted[test]
+
+        with futures.ThreadPoolExecutor(self.concurrency) as executor:
+            for test in self._tests:
+                if hasattr(test, 'dependencies'):
+                    submit(test, result)
+                else:
+                    # An empty suite in place of an unrequested test.
+                    test(result)
+            for future in submitted.values():
+                future.result()
+
+        return result
+
     def start(self, result, tests=None):
         """Start fixtures when using pytest."""
         tests = tests or []
@@ -123,3 +175,28 @@ class GabbiSuite(unittest.TestSuite):
             if hasattr(test, 'fixtures'):
                 return test
         raise AttributeError('no fixtures found')
+
+
+class _RecordingResult:
+    """Record what a test reports so it can be given to a result later.
+
+    Only startTest, stopTest and the add methods are recorded. Anything
+    else, such as shouldStop, is used from the wrapped result.
+    """
+
+    def __init__(self, result):
+        self._result = result
+        self._calls = []
+
+    def __getattr__(self, name):
+        attribute = getattr(self._result, name)
+        if not (name.startswith('add') or name in ('startTest', 'stopTest')):
+            return attribute
+
+        def record(*args, **kwargs):
+            self._calls.append((name, args, kwargs))
+        return record
+
+    def replay(self):
+        for name, args, kwargs in self._calls:
+            getattr(self._result, name)(*args, **kwargs)
@@ -17,13 +17,11 @@ The key piece of code is :meth:`test_suite_from_dict`. It produces a
 :class:`gabbi.case.HTTPTestCase`.
 """
 
-import copy
-import functools
-import unittest
+from http import cookiejar
+import warnings
 
 from gabbi import case
 from gabbi.exception import GabbiFormatError
-from gabbi import httpclient
 from gabbi import suite
 
 
@@ -35,12 +33,21 @@ class TestMaker:
     to pass these around when making each test case. So they are
     wrapped in this class which then has make_one_test called multiple
     times to generate all the tests in the suite.
+
+    The loader argument is no longer used, and is kept only so that
+    the arguments after it keep their positions.
     """
 
     def __init__(self, test_base_name, test_defaults, test_directory,
                  fixture_classes, loader, host, port, intercept, prefix,
                  response_handlers, content_handlers, test_loader_name=None,
-                 inner_fixtures=None):
+                 inner_fixtures=None, cookie_jar=None):
+        if loader is not None:
+            with warnings.catch_warnings():
+                warnings.simplefilter('default', DeprecationWarning)
+                warnings.warn('the loader argument of TestMaker is not '
+                              'used, pass None', DeprecationWarning,
+                              stacklevel=2)
         self.test_base_name = test_base_name
         self.test_defaults = test_defaults
         self.default_keys = set(test_defaults.keys())
@@ -48,13 +55,13 @@ class TestMaker:
         self.fixture_classes = fixture_classes
         self.host = host
         self.port = port
-        self.loader = loader
         self.intercept = intercept
         self.prefix = prefix
         self.test_loader_name = test_loader_name
         self.inner_fixtures = inner_fixtures or []
         self.content_handlers = content_handlers
         self.response_handlers = response_handlers
+        self.cookie_jar = cookie_jar
 
     def make_one_test(self, test_dict, prior_test):
         """Create one single HTTPTestCase.
@@ -62,12 +69,14 @@ class TestMaker:
         The returned HTTPTestCase is added to the TestSuite currently
         being built (one per YAML file).
         """
-        test = copy.deepcopy(self.test_defaults)
+        # The defaults are shared by every test, so test_update replaces,
+        # rather than modifies, any value a test overrides.
+        test = dict(self.test_defaults)
         try:
             test_update(test, test_dict)
         except KeyError as exc:
             raise GabbiFormatError('invalid key in test: %s' % exc)
-        except AttributeError as exc:
+        except (AttributeError, TypeError) as exc:
             if not isinstance(test_dict, dict):
                 raise GabbiFormatError(
                     'test chunk is not a dict at "%s"' % test_dict)
@@ -86,55 +95,41 @@ class TestMaker:
             test.get('request_headers', {}).items()
         }.get('host', None)
 
-        http_class = httpclient.get_http(verbose=test['verbose'],
-                                         caption=test['name'],
-                                         cert_validate=test['cert_validate'],
-                                         hostname=hostname,
-                                         intercept=self.intercept,
-                                         prefix=self.prefix,
-                                         timeout=int(test["timeout"]),
-                                         version=int(test["http_version"]))
+        http_args = dict(verbose=test['verbose'],
+                         caption=test['name'],
+                         cert_validate=test['cert_validate'],
+                         hostname=hostname,
+                         intercept=self.intercept,
+                         prefix=self.prefix,
+                         timeout=int(test["timeout"]),
+                         version=int(test["http_version"]),
+                         cookies=self.cookie_jar)
         if prior_test:
             history = prior_test.history
         else:
             history = {}
 
-        test_method_name = 'test_request'
-        test_method = getattr(case.HTTPTestCase, test_method_name)
-
-        @unittest.skipIf(self.host == '', 'No host configured')
-        @functools.wraps(test_method)
-        def do_test(*args, **kwargs):
-            return test_method(*args, **kwargs)
-
-        # Use metaclasses to build a class of the necessary type
-        # and name with relevant arguments.
-        klass = TestBuilder(test_name, (case.HTTPTestCase,),
-                            {'test_data': test,
-                             'test_directory': self.test_directory,
-                             'fixtures': self.fixture_classes,
-                             'inner_fixtures': self.inner_fixtures,
-                             'http': http_class,
-                             'host': self.host,
-                             'intercept': self.intercept,
-                             'content_handlers': self.content_handlers,
-                             'response_handlers': self.response_handlers,
-                             'port': self.port,
-                             'prefix': self.prefix,
-                             'prior': prior_test,
-                             'history': history,
-                             'test_base_name': self.test_base_name,
-                             test_method_name: do_test,
-                             })
-        # We've been asked to, make this test class think it comes
-        # from a different module.
-        if self.test_loader_name:
-            klass.__module__ = self.test_loader_name
-
-        tests = self.loader.loadTestsFromTestCase(klass)
-        history[test['name']] = tests._tests[0]
-        # Return the first (and only) test in the klass.
-        return tests._tests[0]
+        spec = case.TestSpec(test_name=test_name,
+                             test_data=test,
+                             test_directory=self.test_directory,
+                             test_base_name=self.test_base_name,
+                             test_loader_name=(self.test_loader_name
+                                               or __name__),
+                             fixtures=self.fixture_classes,
+                             inner_fixtures=self.inner_fixtures,
+                             http_args=http_args,
+                             host=self.host,
+                             intercept=self.intercept,
+                             content_handlers=self.content_handlers,
+                             response_handlers=self.response_handlers,
+                             port=self.port,
+                             prefix=self.prefix,
+                             prior=prior_test,
+                             cookie_jar=self.cookie_jar,
+                             history=history)
+        this_test = case.HTTPTestCase('test_request', spec=spec)
+        history[test['name']] = this_test
+        return this_test
 
     def _set_test_name(self, test):
         """Set the name of the test
@@ -146,8 +141,7 @@ class TestMaker:
         if not test['name']:
             raise GabbiFormatError('Test name missing in a test in %s.'
                                    % self.test_base_name)
-        return '%s_%s' % (self.test_base_name,
-                          test['name'].lower().replace(' ', '_'))
+        return _test_name(self.test_base_name, test['name'])
 
     @staticmethod
     def _set_test_method_and_url(test, test_name):
@@ -190,28 +184,30 @@ class TestMaker:
                    ', '.join(list(test_keys - self.default_keys))))
 
 
-class TestBuilder(type):
-    """Metaclass to munge a dynamically created test."""
-
-    required_attributes = {'has_run': False}
-
-    def __new__(mcs, name, bases, attributes):
-        attributes.update(mcs.required_attributes)
-        return type.__new__(mcs, name, bases, attributes)
-
-
 def test_suite_from_dict(loader, test_base_name, suite_dict, test_directory,
                          host, port, fixture_module, intercept, prefix='',
                          handlers=None, test_loader_name=None,
-                         inner_fixtures=None):
+                         inner_fixtures=None, select=None):
     """Generate a GabbiSuite from a dict represent a list of tests.
 
+    If select, a collection of test names (see :func:`test_names`), is
+    provided only those tests are added to the suite. The tests before
+    them are made too, so they may be run as priors, but those after
+    the last selected test are not made.
+
     The dict takes the form:
 
     :param fixtures: An optional list of fixture classes that this suite
                      can use.
     :param defaults: An optional dictionary of default values to be used
                      in each test.
+    :param cookie_jar: If true, the tests in the suite share a cookie
+                       jar. Cookies set by responses are sent with later
+                       requests and $COOKIE refers to the jar.
+    :param concurrency: An optional number of tests which may run at
+                        the same time. Tests are ordered by the
+                        dependencies between them. It may not be more
+                        than 1 with a cookie_jar.
     :param tests: A list of individual tests, themselves each being a
                   dictionary. See :data:`gabbi.case.BASE_TEST`.
     """
@@ -230,10 +226,10 @@ def test_suite_from_dict(loader, test_base_name, suite_dict, test_directory,
     content_handlers = []
 
     # Merge global with per-suite defaults
-    default_test_dict = copy.deepcopy(case.HTTPTestCase.base_test)
+    default_test_dict = dict(case.HTTPTestCase.base_test)
     seen_keys = set()
     for handler in handlers:
-        default_test_dict.update(copy.deepcopy(handler.test_base))
+        default_test_dict.update(handler.test_base)
         if handler.response_handler:
             if handler.test_key_suffix not in seen_keys:
                 response_handlers.append(handler.response_handler)
@@ -251,34 +247,255 @@ def test_suite_from_dict(loader, test_base_name, suite_dict, test_directory,
         for fixture_class in fixtures:
             fixture_classes.append(getattr(fixture_module, fixture_class))
 
+    concurrency = suite_dict.get('concurrency', 1)
+    if (not isinstance(concurrency, int) or isinstance(concurrency, bool)
+            or concurrency < 1):
+        raise GabbiFormatError(
+            'concurrency must be a positive integer, not "%s"' % concurrency)
+
+    cookie_jar = None
+    if suite_dict.get('cookie_jar'):
+        if concurrency > 1:
+            # Every test sends and updates the cookies in the jar, so
+            # none may run alongside another.
+            raise GabbiFormatError(
+                'cookie_jar may not be used with a concurrency above 1')
+        cookie_jar = cookiejar.CookieJar()
+
     test_maker = TestMaker(test_base_name, default_test_dict, test_directory,
-                           fixture_classes, loader, host, port, intercept,
+                           fixture_classes, None, host, port, intercept,
                            prefix, response_handlers, content_handlers,
                            test_loader_name=test_loader_name,
-                           inner_fixtures=inner_fixtures)
+                           inner_fixtures=inner_fixtures,
+                           cookie_jar=cookie_jar)
+    if select is not None:
+        select = set(select)
     file_suite = suite.GabbiSuite()
+    tests = []
     prior_test = None
     for test_dict in test_data:
+        if select is not None and not select:
+            break
         this_test = test_maker.make_one_test(test_dict, prior_test)
-        file_suite.addTest(this_test)
+        if select is None:
+            file_suite.addTest(this_test)
+        elif this_test.test_name in select:
+            file_suite.addTest(this_test)
+            select.discard(this_test.test_name)
+        tests.append(this_test)
         prior_test = this_test
 
+    _count_consumers(tests)
+    if concurrency > 1:
+        _set_dependencies(tests)
+        file_suite.concurrency = concurrency
     return file_suite
 
 
+def test_names(test_base_name, suite_dict):
+    """List the names of the tests in a suite without making them.
+
+    The names are those the tests made by :func:`test_suite_from_dict`
+    will have, so a selection of tests may be resolved before any are
+    made. None is returned if suite_dict is malformed: the suite must
+    then be made in full so the problem is reported.
+    """
+    try:
+        names = [test_dict['name'] for test_dict in suite_dict['tests']]
+        if not all(names):
+            return None
+        return [_test_name(test_base_name, name) for name in names]
+    except (AttributeError, KeyError, TypeError):
+        return None
+
+
 def test_update(orig_dict, new_dict):
-    """Modify test in place to update with new data."""
+    """Modify test in place to update with new data.
+
+    The values in orig_dict are not modified, a merged dict replaces
+    them, so they may be shared with other tests.
+    """
     for key, val in new_dict.items():
         if key == 'data':
             orig_dict[key] = val
         elif isinstance(val, dict):
-            orig_dict[key].update(val)
+            orig_dict[key] = {**orig_dict[key], **val}
         elif isinstance(val, list):
             orig_dict[key] = orig_dict.get(key, []) + val
         else:
             orig_dict[key] = val
 
 
+def _count_consumers(tests):
+    """Record which tests may use the response payload of which others.
+
+    Only a $RESPONSE template uses the body of an earlier response.
+    Once every test which refers to a test has run, that test's
+    payload is released (see HTTPTestCase.release_response) so long
+    sequences of requests do not hold every response in memory.
+    """
+    shared = {}
+    shared_files = {}
+    for index, test in enumerate(tests):
+        referred = set()
+        if _reads_data_files(test.test_data, shared_files):
+            # Templates in a data file are not visible until it is
+            # read, so assume it may refer to any earlier test.
+            referred.update(tests[:index])
+        for replacer, name in _find_references(test.test_data, shared):
+            if replacer != 'RESPONSE':
+                continue
+            if name is None:
+                referred_case = test.prior
+            else:
+                referred_case = test.history.get(name)
+            if referred_case is not None:
+                referred.add(referred_case)
+        test.consumes = list(referred)
+        for referred_case in referred:
+            referred_case.consumers += 1
+
+
+def _set_dependencies(tests):
+    """Record which earlier tests each test must wait for.
+
+    A test depends on the tests it refers to in templates, on those
+    named in its depends_on list and, if it reads a data file, on every
+    earlier test. A serial test depends on every earlier test and every
+    later test depends on it.
+    """
+    positions = {test: index for index, test in enumerate(tests)}
+    shared = {}
+    shared_files = {}
+    barrier = None
+    for index, test in enumerate(tests):
+        dependencies = []
+        if barrier is not None:
+            dependencies.append(barrier)
+        if test.test_data['serial'] or _reads_data_files(test.test_data,
+                                                         shared_files):
+            dependencies.extend(tests[:index])
+        for _, name in _find_references(test.test_data, shared):
+            if name is None:
+                dependencies.append(test.prior)
+            else:
+                dependencies.append(test.history.get(name))
+        for name in _as_list(test.test_data['depends_on']):
+            dependency = test.history.get(name)
+            if positions.get(dependency, index) >= index:
+                raise GabbiFormatError(
+                    'test "%s" depends_on "%s" which is not an earlier test'
+                    % (test.test_data['name'], name))
+            dependencies.append(dependency)
+        # Keep the order of the suite and drop duplicates and any test
+        # which is not earlier in the suite.
+        test.dependencies = sorted(
+            {dependency for dependency in dependencies
+             if positions.get(dependency, index) < index},
+            key=positions.get)
+        if test.test_data['serial']:
+            barrier = test
+
+
+def _find_references(test_data, shared):
+    """Find the references to earlier tests made by a test's templates.
+
+    Container values may be shared by several tests, for example those
+    taken from the defaults, so the references in each are found once
+    and kept in shared, by identity.
+    """
+    references = []
+    for key, value in test_data.items():
+        references.extend(case.find_references(key))
+        if isinstance(value, (dict, list)):
+            if id(value) not in shared:
+                # Keep the value so its id is not reused.
+                shared[id(value)] = (value, list(case.find_references(value)))
+            references.extend(shared[id(value)][1])
+        else:
+            references.extend(case.find_references(value))
+    return references
+
+
+def _reads_data_files(test_data, shared):
+    """Report if a test may read a data file named with ``<@``.
+
+    Files are named in data and in the expected values of response
+    handlers, such as response_json_paths, so any value is checked.
+    As in _find_references, the result for each container value is
+    kept in shared, by identity.
+    """
+    for value in test_data.values():
+        if isinstance(value, (dict, list)):
+            if id(value) not in shared:
+                shared[id(value)] = (value, _names_data_file(value))
+            if shared[id(value)][1]:
+                return True
+        elif _names_data_file(value):
+            return True
+    return False
+
+
+def _names_data_file(value):
+    """Report if value, or any value in it, starts with ``<@``."""
+    if isinstance(value, dict):
+        return any(_names_data_file(item) for item in value.values())
+    if isinstance(value, list):
+        return any(_names_data_file(item) for item in value)
+    return isinstance(value, str) and value.startswith('<@')
+
+
+def test_tags(suite_dict):
+    """List the tags of the tests in a suite without making them.
+
+    A test has the tags set in the defaults of the suite as well as its
+    own, as a set of strings, so a tag written as ``1`` in YAML is
+    ``'1'``, as it is on the command line. None is returned if
+    suite_dict is malformed.
+    """
+    try:
+        defaults = {'tags': suite_dict.get('defaults', {}).get('tags', [])}
+        tags = []
+        for test_dict in suite_dict['tests']:
+            test = dict(defaults)
+            test_update(test, {'tags': test_dict.get('tags', [])})
+            tags.append({str(tag) for tag in set(_as_list(test['tags']))})
+        return tags
+    except (AttributeError, KeyError, TypeError):
+        return None
+
+
+def select_tests(test_base_name, suite_dict, select):
+    """Choose tests from a suite without making them.
+
+    select is called with the name (see :func:`test_names`) and tags
+    (see :func:`test_tags`) of each test and returns True to choose
+    it. The names of the chosen tests are returned, or None if
+    suite_dict is malformed.
+    """
+    names = test_names(test_base_name, suite_dict)
+    tags = test_tags(suite_dict)
+    if names is None or tags is None:
+        return None
+    return [name for name, test_tags in zip(names, tags)
+            if select(name, test_tags)]
+
+
+def _as_list(value):
+    """Make a single value into a list of one."""
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+def _test_name(test_base_name, name):
+    """Make the name of a test from its file and the name it is given.
+
+    The name is lowercased and spaces are replaced with '_'.
+    """
+    return '%s_%s' % (test_base_name, name.lower().replace(' ', '_'))
+
+
 def _is_method_shortcut(key):
     """Is this test key indicating a request method.
 
@@ -58,6 +58,9 @@ class SimpleWsgi:
             ('X-Gabbi-url', full_request_url),
         ]
 
+        if 'HTTP_COOKIE' in environ:
+            headers.append(('X-Gabbi-cookie', environ['HTTP_COOKIE']))
+
         if request_method == 'DIE':
             raise Exception('because you asked me to')
 
@@ -115,11 +118,31 @@ class SimpleWsgi:
             # fall through if we've ended the loop
         elif path_info == '/cookie':
             headers.append(('Set-Cookie', 'session=1234; domain=.example.com'))
+        elif path_info == '/setcookie':
+            # Set a cookie for each query parameter, expiring any
+            # with the value "expire".
+            for name, values in query_data.items():
+                if values[0] == 'expire':
+                    headers.append(
+                        ('Set-Cookie', '%s=; path=/; max-age=0' % name))
+                else:
+                    headers.append(
+                        ('Set-Cookie', '%s=%s; path=/' % (name, values[0])))
         elif path_info == '/jsonator':
             json_data = json.dumps({query_data['key'][0]:
                                     query_data['value'][0]})
             start_response('200 OK', [('Content-Type', 'application/json')])
             return [json_data.encode('utf-8')]
+        elif path_info == '/binary':
+            # A PNG signature followed by size bytes counting up, sent
+            # in chunks.
+            size = int(query_data.get('size', [1000])[0])
+            body = b'\x89PNG\r\n\x1a\n' + bytes(
+                index % 256 for index in range(size))
+            start_response('200 OK',
+                           [('Content-Type', 'application/octet-stream')])
+            return [body[index:index + 100]
+                    for index in range(0, len(body), 100)]
         elif path_info == '/nan':
             start_response('200 OK', [('Content-Type', 'application/json')])
             return [json.dumps({
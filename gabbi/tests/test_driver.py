@@ -12,10 +12,20 @@
 # under the License.
 """Test that the driver can build tests effectively."""
 
+import json
 import os
+import shutil
+import tempfile
 import unittest
+from unittest import mock
+import warnings
+
+import yaml
 
 from gabbi import driver
+from gabbi import exception
+from gabbi import suitemaker
+from gabbi import utils
 
 
 TESTS_DIR = 'test_gabbits'
@@ -37,8 +47,11 @@ class DriverTest(unittest.TestCase):
                          'contained suite contains three tests')
         the_one_test = suite._tests[0]._tests[0]
         self.assertEqual('test_driver_sample_one',
-                         the_one_test.__class__.__name__,
-                         'test class name maps')
+                         the_one_test.test_name,
+                         'test name maps')
+        self.assertEqual(
+            'gabbi.suitemaker.test_driver_sample_one.test_request',
+            the_one_test.id())
         self.assertEqual('one',
                          the_one_test.test_data['name'])
         self.assertEqual('/', the_one_test.test_data['url'])
@@ -116,3 +129,197 @@ class DriverTest(unittest.TestCase):
                                    use_prior_test=False)
         for test in suite._tests[0]._tests:
             self.assertEqual(False, test.test_data['use_prior_test'])
+
+    def test_build_select(self):
+        suite = driver.build_tests(
+            self.test_dir, self.loader, host='localhost',
+            select=lambda name, tags: name == 'test_driver_sample_two')
+        tests = suite._tests[0]._tests
+        self.assertEqual(['test_driver_sample_two'],
+                         [test.test_name for test in tests])
+        # The prior is made, the tests after the selection are not.
+        self.assertEqual('one', tests[0].prior.test_data['name'])
+        self.assertEqual(['one', 'two'], list(tests[0].history))
+
+    def test_build_select_nothing(self):
+        suite = driver.build_tests(self.test_dir, self.loader,
+                                   host='localhost',
+                                   select=lambda name, tags: False)
+        self.assertEqual([], suite._tests)
+
+    def test_build_loader_name_patterns(self):
+        loader = unittest.TestLoader()
+        loader.testNamePatterns = ['*sample_use_prior*']
+        suite = driver.build_tests(self.test_dir, loader, host='localhost',
+                                   test_loader_name='driver')
+        tests = suite._tests[0]._tests
+        self.assertEqual(['driver.sample_use_prior_false.test_request'],
+                         [test.id() for test in tests])
+
+    def test_build_load_workers(self):
+        test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_dir)
+        for name in ('one', 'two', 'three'):
+            shutil.copy(os.path.join(self.test_dir, 'sample.yaml'),
+                        os.path.join(test_dir, '%s.yaml' % name))
+
+        serial = driver.build_tests(test_dir, self.loader, host='localhost',
+                                    load_workers=1)
+        parallel = driver.build_tests(test_dir, self.loader,
+                                      host='localhost', load_workers=2)
+        serial = [test for file_suite in serial for test in file_suite]
+        parallel = [test for file_suite in parallel for test in file_suite]
+        self.assertEqual(9, len(parallel))
+        self.assertEqual([test.test_name for test in serial],
+                         [test.test_name for test in parallel])
+        self.assertEqual([test.test_data for test in serial],
+                         [test.test_data for test in parallel])
+
+        with open(os.path.join(test_dir, 'four.yaml'), 'w') as bad:
+            bad.write('tests: [\n')
+        with self.assertRaises(yaml.YAMLError):
+            driver.build_tests(test_dir, self.loader, host='localhost',
+                               load_workers=2)
+
+    def test_build_json_suites(self):
+        test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_dir)
+        with open(os.path.join(test_dir, 'suite.json'), 'w') as suite_file:
+            json.dump({'tests': [{'name': 'one', 'GET': '/'}]}, suite_file)
+        # JSON that is not a suite is data for tests.
+        with open(os.path.join(test_dir, 'data.json'), 'w') as data_file:
+            json.dump({'name': 'one'}, data_file)
+
+        suite = driver.build_tests(test_dir, self.loader, host='localhost')
+        self.assertEqual(['test_driver_suite_one'],
+                         [test.test_name
+                          for file_suite in suite for test in file_suite])
+
+    def test_build_malformed_json_suite(self):
+        test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_dir)
+        with open(os.path.join(test_dir, 'bad.json'), 'w') as suite_file:
+            suite_file.write('{"tests": [')
+
+        with self.assertRaises(ValueError):
+            driver.build_tests(test_dir, self.loader, host='localhost')
+
+    def test_build_malformed_json_data(self):
+        test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_dir)
+        with open(os.path.join(test_dir, 'suite.yaml'), 'w') as suite_file:
+            suite_file.write('tests:\n- name: bad data\n'
+                             '  POST: /\n  data: <@bad.json\n'
+                             '  status: 400\n')
+        # Data which is meant to be invalid JSON.
+        with open(os.path.join(test_dir, 'bad.json'), 'w') as data_file:
+            data_file.write('{"name": ')
+
+        suite = driver.build_tests(test_dir, self.loader, host='localhost')
+        self.assertEqual(['test_driver_suite_bad_data'],
+                         [test.test_name
+                          for file_suite in suite for test in file_suite])
+
+    def test_build_empty_yaml(self):
+        test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_dir)
+        open(os.path.join(test_dir, 'empty.yaml'), 'w').close()
+
+        with self.assertRaises(exception.GabbiFormatError):
+            driver.build_tests(test_dir, self.loader, host='localhost')
+
+    def test_build_recursive(self):
+        suite = driver.build_tests(self.test_dir, self.loader,
+                                   host='localhost', recursive=True)
+        self.assertEqual(['test_driver_nested-tagged_smoke',
+                          'test_driver_nested-tagged_slow'],
+                         [test.test_name for test in suite._tests[0]])
+        self.assertEqual(os.path.join(self.test_dir, 'nested'),
+                         suite._tests[0]._tests[0].test_directory)
+        self.assertEqual(2, len(suite._tests))
+
+    def test_build_include_exclude(self):
+        suite = driver.build_tests(self.test_dir, self.loader,
+                                   host='localhost', recursive=True,
+                                   include=['nested/*'])
+        self.assertEqual(1, len(suite._tests))
+        self.assertEqual(2, suite.countTestCases())
+        suite = driver.build_tests(self.test_dir, self.loader,
+                                   host='localhost', recursive=True,
+                                   exclude=['nested/*'])
+        self.assertEqual(['test_driver_sample_one', 'test_driver_sample_two',
+                          'test_driver_sample_use_prior_false'],
+                         [test.test_name for test in suite._tests[0]])
+
+    def test_build_tags(self):
+        suite = driver.build_tests(self.test_dir, self.loader,
+                                   host='localhost', recursive=True,
+                                   tags=['slow'])
+        self.assertEqual(['test_driver_nested-tagged_slow'],
+                         [test.test_name for test in suite._tests[0]])
+        self.assertEqual(1, len(suite._tests))
+        suite = driver.build_tests(self.test_dir, self.loader,
+                                   host='localhost', recursive=True,
+                                   tags=['nested'])
+        self.assertEqual(2, suite.countTestCases())
+
+    def test_test_marks_registered_once(self):
+        suite = driver.build_tests(self.test_dir, self.loader,
+                                   host='localhost', recursive=True,
+                                   tags=['nested'])
+        config = mock.Mock()
+        registered = set()
+        with warnings.catch_warnings():
+            # The mock config does not register the marks with pytest.
+            warnings.simplefilter('ignore')
+            marks = [[mark.name for mark in
+                      driver._test_marks(config, test, registered)]
+                     for test in suite._tests[0]]
+        self.assertEqual([['nested', 'smoke'], ['nested', 'slow']], marks)
+        self.assertEqual(3, config.addinivalue_line.call_count)
+
+    def test_numeric_tag_selected(self):
+        suite_dict = {'tests': [{'name': 'one', 'GET': '/', 'tags': [1]},
+                                {'name': 'two', 'GET': '/', 'tags': [2]}]}
+        metafunc = mock.Mock()
+        metafunc.config.getoption.return_value = '1'
+        metafunc.definition.iter_markers.return_value = []
+        for select in (driver._marker_select(metafunc),
+                       driver._tag_select(['1']), driver._tag_select([1])):
+            self.assertEqual(
+                ['foo_one'],
+                suitemaker.select_tests('foo', suite_dict, select))
+
+    def test_expression_evaluator(self):
+        evaluate = driver._expression_evaluator('smoke and not slow')
+        self.assertTrue(evaluate(lambda name, **kwargs: name == 'smoke'))
+        self.assertFalse(evaluate(lambda name, **kwargs: True))
+
+        def unknown(name, **kwargs):
+            raise ValueError(name)
+        # The test is kept for pytest to select.
+        self.assertTrue(evaluate(unknown))
+
+    def test_expression_evaluator_unusable(self):
+        compiled = mock.Mock()
+        compiled.evaluate.side_effect = TypeError()
+        with mock.patch('_pytest.mark.expression.Expression.compile',
+                        return_value=compiled):
+            self.assertIsNone(driver._expression_evaluator('smoke'))
+
+    def test_build_shard(self):
+        timings_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, timings_dir)
+        timings = os.path.join(timings_dir, 'timings.json')
+        with open(timings, 'w') as timings_file:
+            json.dump({utils.timings_key(os.path.join(self.test_dir, name),
+                                         timings): seconds
+                       for name, seconds in (('sample.yaml', 1),
+                                             ('nested/tagged.yaml', 2))},
+                      timings_file)
+
+        shards = [driver.build_tests(self.test_dir, self.loader,
+                                     host='localhost', recursive=True,
+                                     shard='%s/2' % index, timings=timings)
+                  for index in (1, 2)]
+        self.assertEqual([2, 3], [shard.countTestCases() for shard in shards])
@@ -16,13 +16,15 @@
 import json
 import os
 import unittest
+from unittest import mock
 
 from gabbi import case
+from gabbi.exception import GabbiDataLoadError
 from gabbi.exception import GabbiFormatError
+from gabbi.handlers import base
 from gabbi.handlers import core
 from gabbi.handlers import jsonhandler
 from gabbi.handlers import yaml_disk_loading_jsonhandler
-from gabbi import suitemaker
 
 
 class HandlersTest(unittest.TestCase):
@@ -35,9 +37,8 @@ class HandlersTest(unittest.TestCase):
     def setUp(self):
         super(HandlersTest, self).setUp()
         self.test_class = case.HTTPTestCase
-        self.test = suitemaker.TestBuilder('mytest', (self.test_class,),
-                                           {'test_data': {},
-                                            'content_handlers': []})
+        self.test = type('mytest', (self.test_class,),
+                         {'test_data': {}, 'content_handlers': []})
 
     def test_empty_response_handler(self):
         self.test.test_data = {'url': '$RESPONSE["barnabas"]'}
@@ -72,6 +73,44 @@ class HandlersTest(unittest.TestCase):
         with self.assertRaises(AssertionError):
             self._assert_handler(handler)
 
+    def test_response_strings_overlapping(self):
+        handler = core.StringResponseHandler()
+        self.test.content_type = "text/plain"
+        self.test.response_data = None
+        self.test.test_data = {'response_strings': [
+            'alpha beta', 'alpha', 'pha', 'beta', '/al.ha/', 'a b']}
+        self.test.output = 'xx alpha beta xx\n'
+        self._assert_handler(handler)
+
+    def test_response_strings_fail_message(self):
+        handler = core.StringResponseHandler()
+        self.test.content_type = "text/plain"
+        self.test.response_data = None
+        self.test.test_data = {'response_strings': ['alpha', 'gamma', 'bet']}
+        self.test.output = 'alpha\nbeta\n'
+        with self.assertRaises(AssertionError) as cm:
+            self._assert_handler(handler)
+        self.assertEqual("'gamma' not found in alpha\nbeta\n",
+                         str(cm.exception))
+
+    def test_response_strings_fail_truncated(self):
+        handler = core.StringResponseHandler()
+        json_handler = jsonhandler.JSONHandler()
+        self.test.content_type = "application/json"
+        self.test.content_handlers = [json_handler]
+        self.test.response_data = {'items': list(range(100000))}
+        self.test.test_data = {'response_strings': ['gamma']}
+        self.test.output = json_handler.dumps(self.test.response_data)
+        with mock.patch.dict(os.environ, {'GABBI_MAX_CHARS_OUTPUT': '28'}):
+            with mock.patch.object(json_handler, 'dumps') as dumps:
+                with self.assertRaises(AssertionError) as cm:
+                    self._assert_handler(handler)
+        dumps.assert_not_called()
+        self.assertEqual(
+            "'gamma' not found in {\n  \"items\": [\n    0,\n    1,"
+            "\n...truncated...",
+            str(cm.exception))
+
     def test_response_strings_fail_big_output(self):
         handler = core.StringResponseHandler()
         self.test.content_type = "text/plain"
@@ -120,6 +159,123 @@ class HandlersTest(unittest.TestCase):
             self.assertIn("response_strings in 'omega test'",
                           str(exc))
 
+    def test_response_time(self):
+        handler = core.ResponseTimeHandler()
+        self.test.test_data = {'name': 'timed', 'response_time': {
+            'total': 0.5, 'ttfb': '$ENVIRON["GABBI_TEST_TTFB"]'}}
+        self.test.response_timings = {'total': 0.25, 'ttfb': 0.1}
+        with mock.patch.dict(os.environ, {'GABBI_TEST_TTFB': '0.2'}):
+            self._assert_handler(handler)
+
+    def test_response_time_fail(self):
+        handler = core.ResponseTimeHandler()
+        self.test.test_data = {'name': 'timed', 'response_time': {
+            'total': 0.5, 'ttfb': 0.2}}
+        self.test.response_timings = {'total': 0.75, 'ttfb': 0.1}
+        with self.assertRaises(AssertionError) as cm:
+            self._assert_handler(handler)
+        self.assertEqual(
+            'Expect response total time of at most 0.5s, got 0.750s',
+            str(cm.exception))
+
+    def test_response_time_unset(self):
+        handler = core.ResponseTimeHandler()
+        self.test.test_data = {'name': 'timed', 'response_time': {
+            'total': None}}
+        self.test.response_timings = {'total': 0.75, 'ttfb': 0.1}
+        self._assert_handler(handler)
+
+    def test_response_time_bad_format(self):
+        handler = core.ResponseTimeHandler()
+        self.test.response_timings = {'total': 0.75, 'ttfb': 0.1}
+        for budget in [{'latency': 1}, {'total': 'soon'}]:
+            self.test.test_data = {'name': 'timed', 'response_time': budget}
+            with self.assertRaises(GabbiFormatError):
+                self._assert_handler(handler)
+
+    def test_response_percentiles(self):
+        self.test.latencies = [{'total': total, 'ttfb': 0.1}
+                               for total in [0.5, 0.1, 0.4, 0.2, 0.3]]
+        for handler, budget in [(core.P50ResponseTimeHandler(), 0.3),
+                                (core.P95ResponseTimeHandler(), 0.5),
+                                (core.P99ResponseTimeHandler(), 0.5),
+                                (core.MaxResponseTimeHandler(), 0.5)]:
+            key = 'response_%s' % handler.test_key_suffix
+            self.test.test_data = {'name': 'timed', key: {'total': budget}}
+            self._assert_handler(handler)
+            self.test.test_data = {'name': 'timed', key: {
+                'total': budget - 0.01}}
+            with self.assertRaises(AssertionError):
+                self._assert_handler(handler)
+
+    def test_response_percentile_fail(self):
+        handler = core.P95ResponseTimeHandler()
+        self.test.test_data = {'name': 'timed', 'response_p95': {
+            'ttfb': 0.1}}
+        self.test.latencies = [{'total': 1, 'ttfb': 0.05}] * 19 + [
+            {'total': 1, 'ttfb': 0.2}]
+        self._assert_handler(handler)
+        self.test.latencies.append({'total': 1, 'ttfb': 0.2})
+        with self.assertRaises(AssertionError) as cm:
+            self._assert_handler(handler)
+        self.assertEqual(
+            'Expect response p95 ttfb time of at most 0.1s, got 0.200s',
+            str(cm.exception))
+
+    def _feed_body(self, handler, chunks):
+        consumer = handler.body_consumer(self.test('test_request'))
+        for chunk in chunks:
+            consumer.feed(chunk)
+        self.test.body_results = {handler._key: consumer.close()}
+
+    def test_response_length(self):
+        handler = core.LengthResponseHandler()
+        self.test.test_data = {'name': 'sized', 'response_length': 0}
+        self._feed_body(handler, [])
+        self._assert_handler(handler)
+        self._feed_body(handler, [b'a'])
+        with self.assertRaises(AssertionError) as cm:
+            self._assert_handler(handler)
+        self.assertEqual('Expect response length 0, got 1',
+                         str(cm.exception))
+
+    def test_response_sha256(self):
+        handler = core.SHA256ResponseHandler()
+        self.test.test_data = {'name': 'hashed', 'response_sha256': (
+            'BA7816BF8F01CFEA414140DE5DAE2223B00361A396177A9CB410FF61F20015AD'
+        )}
+        self._feed_body(handler, [b'a', b'', b'bc'])
+        self._assert_handler(handler)
+
+    def test_response_bytes(self):
+        handler = core.BytesResponseHandler()
+        self.test.test_data = {'name': 'ranged', 'response_bytes': {
+            0: '00',
+            3: '03 04 05',
+            '9': b'\x09',
+            -3: '0e0f10',
+            -1: '10',
+        }}
+        body = bytes(range(17))
+        self._feed_body(handler, [body[:4], body[4:5], body[5:16],
+                                  body[16:]])
+        self._assert_handler(handler)
+
+        self.test.test_data['response_bytes'] = {-20: '00'}
+        self._feed_body(handler, [body])
+        with self.assertRaises(AssertionError) as cm:
+            self._assert_handler(handler)
+        self.assertEqual('Expect response bytes at -20 to be 00, got ',
+                         str(cm.exception))
+
+    def test_response_bytes_bad_format(self):
+        handler = core.BytesResponseHandler()
+        for ranges in [{'start': '00'}, {0: 'zz'}]:
+            self.test.test_data = {'name': 'ranged',
+                                   'response_bytes': ranges}
+            with self.assertRaises(GabbiFormatError):
+                handler.body_consumer(self.test('test_request'))
+
     def test_response_json_paths(self):
         handler = jsonhandler.JSONHandler()
         self.test.content_type = "application/json"
@@ -166,6 +322,75 @@ class HandlersTest(unittest.TestCase):
         with self.assertRaises(AssertionError):
             self._assert_handler(handler)
 
+    def test_response_json_paths_fail_in_order(self):
+        handler = jsonhandler.JSONHandler()
+        self.test.content_type = "application/json"
+        self.test.test_data = {'response_json_paths': {
+            '$.objects[0].name': 'cw',
+            '$.objects[1].name': 'cow',
+            '$.objects[5].name': 'cow',
+        }}
+        self.test.response_data = {
+            'objects': [{'name': 'cw',
+                         'location': 'barn'},
+                        {'name': 'chris',
+                         'location': 'house'}]
+        }
+        with self.assertRaises(AssertionError) as cm:
+            self._assert_handler(handler)
+        self.assertIn('Unable to match $.objects[1].name as cow, got chris',
+                      str(cm.exception))
+
+    def test_response_json_paths_fail_no_match_big_response(self):
+        handler = jsonhandler.JSONHandler()
+        self.test.content_type = "application/json"
+        self.test.test_data = {'response_json_paths': {
+            '$.missing': 'cow',
+        }}
+        self.test.response_data = {
+            'objects': [{'name': 'cow-%d' % index, 'location': 'barn'}
+                        for index in range(100000)]
+        }
+        with self.assertRaises(AssertionError) as cm:
+            self._assert_handler(handler)
+        message = str(cm.exception)
+        self.assertIn('left hand side json path $.missing cannot match',
+                      message)
+        self.assertLess(len(message), 1000)
+
+    def test_response_json_paths_fail_differences(self):
+        handler = jsonhandler.JSONHandler()
+        self.test.content_type = "application/json"
+        self.test.test_data = {'response_json_paths': {
+            '$.objects': [{'name': 'cow', 'location': 'barn'},
+                          {'name': 'chris', 'location': 'field'}],
+        }}
+        self.test.response_data = {
+            'objects': [{'name': 'cow',
+                         'location': 'barn'},
+                        {'name': 'chris',
+                         'location': 'house',
+                         'size': 1}]
+        }
+        with self.assertRaises(AssertionError) as cm:
+            self._assert_handler(handler)
+        self.assertEqual([
+            "$.objects[1].size: unexpected 1",
+            "$.objects[1].location: 'field' != 'house'",
+        ], str(cm.exception).splitlines()[1:])
+
+    def test_json_differences_limit(self):
+        expected = {'items': [{'price': i} for i in range(100)]}
+        observed = {'items': [{'price': i + 1} for i in range(101)]}
+        differences = jsonhandler.json_differences(expected, observed,
+                                                   limit=3)
+        self.assertEqual([
+            '$.items: expected 100 items, got 101',
+            '$.items[0].price: 0 != 1',
+            '$.items[1].price: 1 != 2',
+            '... stopped after 3 differences',
+        ], differences)
+
     def test_response_json_paths_regex(self):
         handler = jsonhandler.JSONHandler()
         self.test.content_type = "application/json"
@@ -341,6 +566,34 @@ class HandlersTest(unittest.TestCase):
         self.test.response = {'content-type': 'text/plain; charset=UTF-8'}
         self._assert_handler(handler)
 
+    def test_passing_assertions_format_no_message(self):
+        self.test.content_type = 'application/json'
+        self.test.response = {'content-type': 'application/json',
+                              'x-size': '100000'}
+        self.test.response_data = {'items': ['abc'] * 100000}
+        self.test.output = json.dumps(self.test.response_data)
+        self.test.test_data = {
+            'response_strings': ['/"abc"]}$/'],
+            'response_headers': {'content-type': 'application/json',
+                                 'x-size': '/^1/'},
+            'response_forbidden_headers': ['location'],
+            'response_json_paths': {'$.items[99999]': '/^abc$/'},
+        }
+        handlers = [core.StringResponseHandler(),
+                    core.HeadersResponseHandler(),
+                    core.ForbiddenHeadersResponseHandler(),
+                    jsonhandler.JSONHandler()]
+        with mock.patch.object(base.LazyMessage, '__str__',
+                               return_value='failed') as message:
+            for handler in handlers:
+                self._assert_handler(handler)
+            message.assert_not_called()
+
+            self.test.test_data = {'response_strings': ['/^abc/']}
+            with self.assertRaises(AssertionError):
+                self._assert_handler(core.StringResponseHandler())
+            message.assert_called_once_with()
+
     def test_response_headers_substitute_noregex(self):
         handler = core.HeadersResponseHandler()
         self.test.location = '/foo/bar/'
@@ -481,3 +734,32 @@ class TestJSONHandlerAccept(unittest.TestCase):
         for test in cases:
             with self.subTest(test[0]):
                 self._test_content_type(*test)
+
+
+class TestJSONCodec(unittest.TestCase):
+    """Test the selection and fallback of the JSON decoder."""
+
+    def test_loads_bytes(self):
+        self.assertEqual({'alpha': 'ö'},
+                         jsonhandler.JSONHandler.loads('{"alpha": "ö"}'
+                                                       .encode('utf-8')))
+
+    def test_loads_nan(self):
+        data = jsonhandler.JSONHandler.loads(b'{"nan": NaN}')
+        self.assertNotEqual(data['nan'], data['nan'])
+
+    def test_loads_big_int(self):
+        self.assertEqual([2 ** 70],
+                         jsonhandler.JSONHandler.loads(str([2 ** 70])))
+
+    def test_loads_invalid(self):
+        with self.assertRaises(GabbiDataLoadError):
+            jsonhandler.JSONHandler.loads(b'not json')
+
+    def test_select_codec(self):
+        self.assertIs(json.loads, jsonhandler.select_codec('json'))
+        if jsonhandler.optional_module('orjson') is not None:
+            self.assertIs(jsonhandler._fast_loads,
+                          jsonhandler.select_codec('orjson'))
+        else:
+            self.assertIs(json.loads, jsonhandler.select_codec('orjson'))
@@ -18,7 +18,6 @@ import unittest
 
 from gabbi import case
 from gabbi.handlers import jsonhandler
-from gabbi import suitemaker
 
 
 class HistoryTest(unittest.TestCase):
@@ -27,11 +26,10 @@ class HistoryTest(unittest.TestCase):
     def setUp(self):
         super(HistoryTest, self).setUp()
         self.test_class = case.HTTPTestCase
-        self.test = suitemaker.TestBuilder('mytest', (self.test_class,),
-                                           {'test_data': {},
-                                            'content_handlers': [],
-                                            'history': {},
-                                            })
+        self.test = type('mytest', (self.test_class,),
+                         {'test_data': {},
+                          'content_handlers': [],
+                          'history': {}})
 
     def test_header_replace_prior(self):
         self.test.test_data = '$HEADERS["content-type"]'
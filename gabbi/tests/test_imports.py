@@ -0,0 +1,53 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Test that starting gabbi-run does not import what it does not need.
+
+Importing these modules took most of the time gabbi-run spent before
+making its first request. The modules imported are checked, rather
+than the time taken, so the test is reliable.
+"""
+
+import json
+import subprocess
+import sys
+import unittest
+
+
+DEFERRED_MODULES = [
+    'colorama',
+    'concurrent.futures',
+    'ijson',
+    'jsonpath_ng',
+    'orjson',
+    'pytest',
+]
+
+
+class LazyImportTest(unittest.TestCase):
+
+    def _imported(self, statement):
+        """Run statement in a new interpreter and list what it imports."""
+        script = ('import json, sys\n%s\nprint(json.dumps(sorted('
+                  'name for name in %r if name in sys.modules)))'
+                  % (statement, DEFERRED_MODULES))
+        output = subprocess.check_output([sys.executable, '-c', script])
+        return json.loads(output)
+
+    def test_runner_imports(self):
+        self.assertEqual([], self._imported('import gabbi.runner'))
+
+    def test_json_handler_imports_on_use(self):
+        imported = self._imported(
+            'from gabbi.handlers import jsonhandler\n'
+            'jsonhandler.parse_json_path("$.a")')
+        self.assertEqual(['jsonpath_ng'], imported)
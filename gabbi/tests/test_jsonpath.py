@@ -13,7 +13,12 @@
 """Test jsonpath handling
 """
 
+import json
 import unittest
+from unittest import mock
+
+from jsonpath_ng import jsonpath
+import jsonpath_ng.ext as json_parser
 
 from gabbi.handlers import jsonhandler
 
@@ -71,3 +76,158 @@ class JSONPathTest(unittest.TestCase):
     def test_len_object_list(self):
         match = extract(nested_data, '$.objects.`len`')
         self.assertEqual(2, match)
+
+
+class FindJSONPathsTest(unittest.TestCase):
+
+    def test_same_as_extract(self):
+        paths = [
+            '$.objects[0].name',
+            '$.objects[1].value',
+            '$.objects[*].name',
+            '$.objects..value',
+            r'$.objects[?name = "one"].value',
+            r'$.objects[?name = "one"].name',
+            '$.objects.`len`',
+            '$.objects[5].name',
+        ]
+        results = jsonhandler.find_json_paths(nested_data, paths)
+        self.assertEqual(set(paths), set(results))
+        for path in paths:
+            expected = [
+                match.value for match in
+                json_parser.parse(path).find(nested_data)]
+            self.assertEqual(
+                expected, [match.value for match in results[path]], path)
+
+    def test_shared_steps(self):
+        data = {'objects': [{'name': 'one'}]}
+        with mock.patch.object(
+                jsonpath.Fields, 'find',
+                autospec=True,
+                side_effect=jsonpath.Fields.find) as find:
+            jsonhandler.find_json_paths(
+                data, ['$.objects[0].name', '$.objects[0].value'])
+        # objects once, then name and value.
+        self.assertEqual(3, find.call_count)
+
+    def test_filter_values_of_equal_but_different_types(self):
+        data = {'s': [{'id': '1'}, {'id': 1}, {'id': True}, {'id': 1.0},
+                      {'id': 'true'}]}
+        paths = ['$.s[?id = 1]', '$.s[?id = true]', '$.s[?id = 1.0]',
+                 '$.s[?id = "1"]', '$.s[?id = "true"]']
+        for filter_index in (True, False):
+            results = jsonhandler.find_json_paths(data, paths, filter_index)
+            for path in paths:
+                expected = [match.value for match in
+                            json_parser.parse(path).find(data)]
+                self.assertEqual(
+                    expected, [match.value for match in results[path]],
+                    path)
+
+    def test_bad_path(self):
+        results = jsonhandler.find_json_paths(
+            nested_data, ['$.objects[[', '$.objects[0].name'])
+        self.assertIsInstance(results['$.objects[['], Exception)
+        self.assertEqual(
+            ['one'], [match.value for match in results['$.objects[0].name']])
+
+
+class FilterIndexTest(unittest.TestCase):
+
+    data = {'objects': [
+        {'id': 1, 'name': 'one'},
+        {'id': '1', 'name': 'string one'},
+        {'id': True, 'name': 'true'},
+        {'id': [1], 'name': 'list'},
+        {'name': 'none'},
+        'not a dict',
+        {'id': 'two', 'name': 'two'},
+        {'id': 1, 'name': 'another one'},
+    ]}
+
+    def _compare(self, path):
+        expected = [
+            (match.value, str(match.full_path)) for match in
+            json_parser.parse(path).find(self.data)]
+        found = jsonhandler.find_json_paths(self.data, [path])[path]
+        self.assertEqual(
+            expected,
+            [(match.value, str(match.full_path)) for match in found], path)
+
+    def test_same_as_scan(self):
+        for path in [
+                '$.objects[?id = 1].name',
+                '$.objects[?id == "1"].name',
+                '$.objects[?id = true].name',
+                '$.objects[?id = "two"]',
+                '$.objects[?id = "three"]',
+                '$.objects[?name = "none"].name',
+        ]:
+            self._compare(path)
+
+    def test_index_reused(self):
+        index = jsonhandler.FilterIndex()
+        paths = ['$.objects[?id = 1].name', '$.objects[?id = "two"].name']
+        steps = [jsonhandler._json_path_steps(
+            jsonhandler.parse_json_path(path))[2] for path in paths]
+        datum = jsonpath.DatumInContext(self.data['objects'])
+        with mock.patch.object(index, '_index',
+                               wraps=index._index) as make_index:
+            for step in steps:
+                self.assertTrue(index.accepts(step))
+                index.find(step, datum)
+        self.assertEqual(2, make_index.call_count)
+        self.assertEqual(1, len(index._indexes[id(self.data['objects'])]))
+
+    def test_not_accepted(self):
+        for path in ['$.objects[?name > "p"]',
+                     '$.objects[?id = 1 & name = "one"]']:
+            step = jsonhandler._json_path_steps(
+                jsonhandler.parse_json_path(path))[-1]
+            self.assertFalse(jsonhandler.FilterIndex.accepts(step))
+            self._compare(path)
+
+
+@unittest.skipIf(jsonhandler.optional_module('ijson') is None,
+                 'ijson not installed')
+class JSONStreamTest(unittest.TestCase):
+
+    def _stream(self, paths, body, size=5):
+        stream = jsonhandler.JSONStream(paths)
+        for start in range(0, len(body), size):
+            if stream.feed(body[start:start + size]):
+                break
+        return stream, stream.close()
+
+    def test_same_as_find(self):
+        paths = [
+            '$.objects[1].value',
+            '$.objects[*].name',
+            r'$.objects[?name = "one"].value',
+            '$.objects.`len`',
+            '$.objects[5].name',
+            '$..value',
+        ]
+        body = json.dumps(nested_data).encode('utf-8')
+        _, data = self._stream(paths, body)
+        expected = jsonhandler.find_json_paths(nested_data, paths)
+        for path in paths:
+            self.assertEqual(
+                [match.value for match in expected[path]],
+                [match.value for match in data.matches[path]], path)
+        self.assertEqual('beta', extract(data, '$.objects[1].value'))
+
+    def test_stops_early(self):
+        body = json.dumps(
+            {'first': {'name': 'one'}, 'rest': list(range(1000))})
+        stream, data = self._stream(['$.first.name'], body.encode('utf-8'))
+        self.assertEqual('one', extract(data, '$.first.name'))
+        # Only the part wanted is built.
+        self.assertEqual({('first', 'name'): 'one'}, stream._parts)
+        with self.assertRaises(ValueError):
+            extract(data, '$.rest[0]')
+
+    def test_invalid_json(self):
+        with self.assertRaises(jsonhandler.GabbiDataLoadError):
+            self._stream(['$.a'], b'{"a": [1, ')
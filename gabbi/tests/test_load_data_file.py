@@ -13,6 +13,9 @@
 """Test loading data from files with <@.
 """
 
+import json
+import os
+import tempfile
 import unittest
 from unittest import mock
 
@@ -77,3 +80,57 @@ class DataFileTest(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.http_case.load_data_file(filepath)
         self.assertFalse(m_open.called)
+
+
+class DataFileCacheTest(unittest.TestCase):
+    """Test the caching of parsed data files."""
+
+    def setUp(self):
+        self.http_case = case.HTTPTestCase('test_request')
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.http_case.test_directory = self.directory.name
+        self.path = os.path.join(self.directory.name, 'data.json')
+        self._write({'a': 1})
+        self.loads = mock.Mock(side_effect=json.loads)
+        case._DATA_FILE_CACHE.clear()
+        self.addCleanup(case._DATA_FILE_CACHE.clear)
+
+    def _write(self, data, mtime=None):
+        with open(self.path, 'w') as data_file:
+            json.dump(data, data_file)
+        if mtime:
+            os.utime(self.path, ns=(mtime, mtime))
+
+    def test_parsed_once(self):
+        for _ in range(3):
+            self.assertEqual(
+                {'a': 1},
+                self.http_case.load_data_file('data.json', self.loads))
+        self.assertEqual(1, self.loads.call_count)
+
+    def test_changed_file_reparsed(self):
+        self.http_case.load_data_file('data.json', self.loads)
+        self._write({'a': 22}, mtime=10 ** 9)
+        self.assertEqual(
+            {'a': 22}, self.http_case.load_data_file('data.json', self.loads))
+        self.assertEqual(2, self.loads.call_count)
+
+    def test_cache_bounded(self):
+        cache = case._DataFileCache(10)
+        cache.get('one', 6, lambda: 1)
+        cache.get('two', 6, lambda: 2)
+        self.assertEqual(6, cache.used)
+        self.assertEqual(2, cache.get('two', 6, lambda: 'reloaded'))
+        self.assertEqual('reloaded', cache.get('one', 6, lambda: 'reloaded'))
+        self.assertEqual('big', cache.get('big', 11, lambda: 'big'))
+        self.assertEqual(6, cache.used)
+
+    def test_cached_data_not_replaced(self):
+        self._write({'a': '$SCHEME'})
+        data = self.http_case.load_data_file('data.json', self.loads)
+        self.http_case.scheme = 'http'
+        self.assertEqual({'a': 'http'}, self.http_case.replace_template(data))
+        self.assertEqual(
+            {'a': '$SCHEME'},
+            self.http_case.load_data_file('data.json', self.loads))
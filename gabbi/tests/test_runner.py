@@ -16,17 +16,22 @@
 import httpx
 from io import StringIO
 import os
+import shutil
 import socket
 import subprocess
 import sys
+import tempfile
 import time
 import unittest
 from unittest import mock
+import warnings
 
+from gabbi import driver
 from gabbi import exception
 from gabbi.handlers import base
 from gabbi.handlers.jsonhandler import JSONHandler
 from gabbi import runner
+from gabbi import utils
 
 
 def get_free_port():
@@ -118,6 +123,71 @@ class RunnerTest(unittest.TestCase):
         except SystemExit as err:
             self.assertFailure(err)
 
+    def test_shard(self):
+        timings_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, timings_dir)
+        timings = os.path.join(timings_dir, 'timings.json')
+        failure = 'gabbi/tests/gabbits_runner/failure.yaml'
+        successes = ['gabbi/tests/gabbits_runner/success.yaml',
+                     'gabbi/tests/gabbits_runner/success_alt.yaml']
+        utils.save_timings(timings, {
+            utils.timings_key(failure, timings): 10,
+            utils.timings_key(successes[0], timings): 1,
+            utils.timings_key(successes[1], timings): 1})
+        base_argv = ['gabbi-run', 'http://%s:%s/foo' % (self.host, self.port),
+                     '--timings', timings, '--shard']
+
+        # The slow failure is alone in the first shard.
+        sys.argv = base_argv + ['2/2', '--', failure] + successes
+        try:
+            runner.run()
+        except SystemExit as err:
+            self.assertSuccess(err)
+        saved = utils.load_timings(timings)
+        self.assertEqual(10, saved[utils.timings_key(failure, timings)])
+        self.assertLess(saved[utils.timings_key(successes[0], timings)], 1)
+
+        sys.argv = base_argv + ['1/2', '--', failure] + successes
+        try:
+            runner.run()
+        except SystemExit as err:
+            self.assertFailure(err)
+
+    def test_shard_timings_used_by_build_tests(self):
+        timings = os.path.join('gabbi', 'tests', 'gabbits_runner',
+                               'timings.json')
+        self.addCleanup(os.remove, timings)
+        self.addCleanup(os.remove, timings + '.lock')
+        names = ['failure.yaml', 'success.yaml', 'success_alt.yaml']
+        sys.argv = ['gabbi-run', 'http://%s:%s/foo' % (self.host, self.port),
+                    '--timings', timings, '--shard', '1/1', '--']
+        sys.argv.extend('gabbi/tests/gabbits_runner/%s' % name
+                        for name in names)
+        try:
+            runner.run()
+        except SystemExit as err:
+            self.assertFailure(err)
+        self.assertEqual(names, sorted(utils.load_timings(timings)))
+
+        # Make the failure the slowest, so it is alone in its shard.
+        utils.save_timings(timings, {'failure.yaml': 10, 'success.yaml': 1,
+                                     'success_alt.yaml': 1})
+        with warnings.catch_warnings():
+            # success_alt.yaml has a '_' in its name.
+            warnings.simplefilter('ignore', exception.GabbiSyntaxWarning)
+            shards = [driver.build_tests(os.path.dirname(timings),
+                                         unittest.defaultTestLoader,
+                                         host='localhost', include=names,
+                                         shard='%s/2' % index,
+                                         timings=timings)
+                      for index in (1, 2)]
+        self.assertEqual(
+            [['test_runner_failure_expected_failure'],
+             ['test_runner_success_expected_success',
+              'test_runner_success_alt_expected_success']],
+            [[test.test_name for file_suite in shard for test in file_suite]
+             for shard in shards])
+
     def test_unsafe_yaml(self):
         sys.argv = ['gabbi-run', 'http://%s:%s/nan' % (self.host, self.port)]
 
@@ -409,6 +479,65 @@ class RunnerTest(unittest.TestCase):
             except SystemExit as err:
                 self.assertSuccess(err)
 
+    def test_tags(self):
+        sys.argv.append('--tags')
+        sys.argv.append('smoke,fast')
+        sys.stdin = StringIO("""
+        tests:
+        - name: expected success
+          GET: /
+          tags: [smoke]
+        - name: not selected failure
+          GET: /
+          status: 666
+          tags: [slow]
+        """)
+
+        try:
+            runner.run()
+        except SystemExit as err:
+            self.assertSuccess(err)
+        sys.stderr.seek(0)
+        self.assertIn('Ran 1 test', sys.stderr.read())
+
+    def test_stdin_documents(self):
+        sys.stdin = StringIO(
+            'tests:\n'
+            '- name: first\n'
+            '  GET: /\n'
+            '---\n'
+            'tests:\n'
+            '- name: second\n'
+            '  GET: /\n'
+            '  status: 666\n'
+            '---\n'
+            'tests:\n'
+            '- name: third\n'
+            '  GET: /\n')
+
+        try:
+            runner.run()
+        except SystemExit as err:
+            self.assertFailure(err)
+        sys.stderr.seek(0)
+        output = sys.stderr.read()
+        self.assertIn('input_first', output)
+        self.assertIn('input-2_second', output)
+        self.assertIn('input-3_third', output)
+
+    def test_stdin_json_lines_failfast(self):
+        sys.argv.append('--failfast')
+        sys.stdin = StringIO(
+            '{"tests": [{"name": "first", "GET": "/", "status": 666}]}\n'
+            '{"tests": [{"name": "second", "GET": "/"}]}\n')
+
+        try:
+            runner.run()
+        except SystemExit as err:
+            self.assertFailure(err)
+        sys.stderr.seek(0)
+        self.assertNotIn('input-2_second', sys.stderr.read())
+
     def assertSuccess(self, exitError):
         errors = exitError.args[0]
         if errors:
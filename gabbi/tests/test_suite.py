@@ -17,7 +17,10 @@ import sys
 import unittest
 
 from gabbi import fixture
+from gabbi import handlers
+from gabbi import suite
 from gabbi import suitemaker
+from gabbi.tests import simple_wsgi
 
 VALUE_ERROR = 'value error sentinel'
 FIXTURE_METHOD = 'start_fixture'
@@ -56,3 +59,45 @@ class SuiteTest(unittest.TestCase):
         self.assertIn('foo_alpha', str(errored_test))
         self.assertIn(VALUE_ERROR, trace)
         self.assertIn(FIXTURE_METHOD, trace)
+
+    def test_suite_runs_concurrently(self):
+        """Verify a concurrent suite runs and reports every test.
+
+        Tests which refer to earlier tests see their responses.
+        """
+        loader = unittest.defaultTestLoader
+        result = unittest.TestResult()
+        tests = [{'name': 'test%s' % index, 'GET': '/?x=%s' % index}
+                 for index in range(10)]
+        tests.append({'name': 'back', 'GET': '/?y=$RESPONSE["$.x[0]"]',
+                      'response_json_paths': {'$.y[0]': '9'}})
+        tests.append({'name': 'history',
+                      'GET': '/?y=$HISTORY["test3"].$RESPONSE["$.x[0]"]',
+                      'response_json_paths': {'$.y[0]': '3'}})
+        test_data = {'concurrency': 4, 'tests': tests}
+        test_suite = suitemaker.test_suite_from_dict(
+            loader, 'foo', test_data, '.', 'localhost', 80, None,
+            simple_wsgi.SimpleWsgi,
+            handlers=[handler() for handler in handlers.RESPONSE_HANDLERS])
+
+        test_suite.run(result)
+
+        self.assertTrue(result.wasSuccessful(), result.failures)
+        self.assertEqual(12, result.testsRun)
+
+    def test_recording_result_passes_through(self):
+        result = unittest.TestResult()
+        recorder = suite._RecordingResult(result)
+        test = unittest.FunctionTestCase(suite.noop)
+
+        recorder.startTest(test)
+        recorder.addSuccess(test)
+        recorder.stopTest(test)
+        self.assertEqual(0, result.testsRun)
+        # Anything else is used from the result.
+        self.assertTrue(recorder.wasSuccessful())
+        recorder.stop()
+        self.assertTrue(result.shouldStop)
+
+        recorder.replay()
+        self.assertEqual(1, result.testsRun)
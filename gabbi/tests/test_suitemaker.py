@@ -11,12 +11,15 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import json
 import unittest
+import warnings
 
 from gabbi import exception
 from gabbi import handlers
 from gabbi.handlers import yaml_disk_loading_jsonhandler as ydlj_handler
 from gabbi import suitemaker
+from gabbi.tests import simple_wsgi
 
 
 class SuiteMakerTest(unittest.TestCase):
@@ -197,3 +200,260 @@ class SuiteMakerTest(unittest.TestCase):
         )
         response_handlers = file_suite._tests[0].response_handlers
         self.assertIn(ydlj_handler_object, response_handlers)
+
+    def test_tests_share_class(self):
+        test_yaml = {'tests': [
+            {'name': 'one', 'GET': '/'},
+            {'name': 'one', 'GET': '/'},
+        ]}
+        file_suite = suitemaker.test_suite_from_dict(
+            self.loader, 'foo', test_yaml, '.', 'localhost', 80, None, None)
+        one, two = file_suite._tests
+        self.assertIs(type(one), type(two))
+        self.assertNotEqual(one, two)
+        self.assertEqual(2, len({one, two}))
+        self.assertEqual('gabbi.suitemaker.foo_one.test_request', one.id())
+        self.assertIsNone(one._spec.http)
+        self.assertIsNotNone(one.http)
+        self.assertIs(one.http, one.http)
+
+    def test_consumers_counted(self):
+        test_yaml = {'tests': [
+            {'name': 'one', 'GET': '/'},
+            {'name': 'two', 'GET': '$RESPONSE["$.foo"]'},
+            {'name': 'three', 'GET': '/',
+             'response_json_paths': {
+                 '$.x': '$HISTORY["one"].$RESPONSE["$.x"]'}},
+            {'name': 'four', 'GET': '$URL', 'request_headers': {
+                'x-header': '$HEADERS["content-type"]'}},
+        ]}
+        file_suite = suitemaker.test_suite_from_dict(
+            self.loader, 'foo', test_yaml, '.', 'localhost', 80, None, None,
+            handlers=[handler() for handler in handlers.RESPONSE_HANDLERS])
+        one, two, three, four = file_suite._tests
+        self.assertEqual(2, one.consumers)
+        self.assertEqual(0, two.consumers)
+        self.assertEqual([one], two.consumes)
+        self.assertEqual([one], three.consumes)
+        # Only $RESPONSE uses the payload.
+        self.assertEqual(0, three.consumers)
+        self.assertEqual([], four.consumes)
+
+    def test_defaults_shared_not_modified(self):
+        defaults = {
+            'data': {'prior': '$RESPONSE["$.x"]'},
+            'request_headers': {'x-one': '1'},
+            'response_json_paths': {'$.x': 1},
+        }
+        test_yaml = {'defaults': defaults, 'tests': [
+            {'name': 'one', 'GET': '/'},
+            {'name': 'two', 'GET': '/',
+             'request_headers': {'x-two': '2'}},
+            {'name': 'three', 'GET': '/'},
+        ]}
+        file_suite = suitemaker.test_suite_from_dict(
+            self.loader, 'foo', test_yaml, '.', 'localhost', 80, None, None,
+            handlers=[handler() for handler in handlers.RESPONSE_HANDLERS])
+        one, two, three = file_suite._tests
+        self.assertEqual({'x-one': '1'}, defaults['request_headers'])
+        self.assertEqual({'x-one': '1'}, one.test_data['request_headers'])
+        self.assertEqual({'x-one': '1', 'x-two': '2'},
+                         two.test_data['request_headers'])
+        self.assertIs(one.test_data['data'], three.test_data['data'])
+        self.assertEqual([], one.consumes)
+        self.assertEqual([one], two.consumes)
+        self.assertEqual([two], three.consumes)
+
+    def test_data_file_consumes_all(self):
+        test_yaml = {'tests': [
+            {'name': 'one', 'GET': '/'},
+            {'name': 'two', 'GET': '/'},
+            {'name': 'three', 'POST': '/', 'data': '<@data.json'},
+            {'name': 'four', 'GET': '/',
+             'response_json_paths': {'$.x': '<@expected.json:$.x'}},
+        ]}
+        file_suite = suitemaker.test_suite_from_dict(
+            self.loader, 'foo', test_yaml, '.', 'localhost', 80, None, None,
+            handlers=[handler() for handler in handlers.RESPONSE_HANDLERS])
+        one, two, three, four = file_suite._tests
+        self.assertEqual({one, two}, set(three.consumes))
+        self.assertEqual({one, two, three}, set(four.consumes))
+
+    def test_response_released_when_consumer_skipped(self):
+        test_yaml = {'tests': [
+            {'name': 'one', 'GET': '/?x=1'},
+            {'name': 'two', 'GET': '/?x=$RESPONSE["$.x[0]"]'},
+        ]}
+        file_suite = suitemaker.test_suite_from_dict(
+            self.loader, 'foo', test_yaml, '.', 'localhost', 80, None,
+            simple_wsgi.SimpleWsgi,
+            handlers=[handler() for handler in handlers.RESPONSE_HANDLERS])
+        one, two = file_suite._tests
+        result = unittest.TestResult()
+
+        one.run(result)
+        self.assertEqual({'x': ['1']}, one.response_data)
+        # Skipped in setUp, so tearDown does not run.
+        two.host = ''
+        two.run(result)
+        self.assertEqual(1, len(result.skipped))
+        self.assertFalse(hasattr(one, 'response_data'))
+
+    def test_output_decoded_when_used(self):
+        test_yaml = {'tests': [
+            {'name': 'one', 'GET': '/?x=1',
+             'response_json_paths': {'$.x[0]': '1'}},
+            {'name': 'two', 'GET': '/?x=$RESPONSE["$.x[0]"]'},
+        ]}
+        file_suite = suitemaker.test_suite_from_dict(
+            self.loader, 'foo', test_yaml, '.', 'localhost', 80, None,
+            simple_wsgi.SimpleWsgi,
+            handlers=[handler() for handler in handlers.RESPONSE_HANDLERS])
+        one = file_suite._tests[0]
+        result = unittest.TestResult()
+
+        one.run(result)
+        self.assertTrue(result.wasSuccessful(), result.failures)
+        # The JSON was parsed from the bytes of the body.
+        self.assertNotIn('_output', one.__dict__)
+        self.assertEqual({'x': ['1']}, json.loads(one.output))
+        self.assertIn('_output', one.__dict__)
+        one.release_response()
+        self.assertFalse(hasattr(one, 'output'))
+
+    def test_response_released(self):
+        test_yaml = {'tests': [
+            {'name': 'one', 'GET': '/?x=1'},
+            {'name': 'two', 'GET': '/?x=2'},
+            {'name': 'three', 'GET': '/?x=$HISTORY["one"].$RESPONSE["$.x[0]"]',
+             'response_json_paths': {'$.x[0]': '1'}},
+        ]}
+        file_suite = suitemaker.test_suite_from_dict(
+            self.loader, 'foo', test_yaml, '.', 'localhost', 80, None,
+            simple_wsgi.SimpleWsgi,
+            handlers=[handler() for handler in handlers.RESPONSE_HANDLERS])
+        one, two, three = file_suite._tests
+        result = unittest.TestResult()
+
+        one.run(result)
+        self.assertEqual({'x': ['1']}, one.response_data)
+        two.run(result)
+        self.assertFalse(hasattr(two, 'response_data'))
+        self.assertFalse(hasattr(two, 'output'))
+        self.assertEqual({'x': ['1']}, one.response_data)
+        three.run(result)
+        self.assertFalse(hasattr(one, 'response_data'))
+        self.assertTrue(result.wasSuccessful(), result.failures)
+        # Headers remain available.
+        self.assertIn('content-type', one.response)
+
+    def test_dependencies(self):
+        test_yaml = {'concurrency': 4, 'tests': [
+            {'name': 'one', 'GET': '/'},
+            {'name': 'two', 'GET': '/'},
+            {'name': 'three', 'GET': '$LOCATION'},
+            {'name': 'four', 'GET': '/', 'depends_on': ['one']},
+            {'name': 'five', 'GET': '/', 'serial': True},
+            {'name': 'six', 'GET': '/$HISTORY["two"].$URL'},
+            {'name': 'seven', 'GET': '/',
+             'response_json_paths': {'$.x': '<@expected.json'}},
+        ]}
+        file_suite = suitemaker.test_suite_from_dict(
+            self.loader, 'foo', test_yaml, '.', 'localhost', 80, None, None,
+            handlers=[handler() for handler in handlers.RESPONSE_HANDLERS])
+        one, two, three, four, five, six, seven = file_suite._tests
+        self.assertEqual(4, file_suite.concurrency)
+        self.assertEqual([], one.dependencies)
+        self.assertEqual([], two.dependencies)
+        self.assertEqual([two], three.dependencies)
+        self.assertEqual([one], four.dependencies)
+        self.assertEqual([one, two, three, four], five.dependencies)
+        self.assertEqual([two, five], six.dependencies)
+        self.assertEqual([one, two, three, four, five, six],
+                         seven.dependencies)
+
+    def test_no_dependencies_when_sequential(self):
+        test_yaml = {'tests': [
+            {'name': 'one', 'GET': '/'},
+            {'name': 'two', 'GET': '$LOCATION'},
+        ]}
+        file_suite = suitemaker.test_suite_from_dict(
+            self.loader, 'foo', test_yaml, '.', 'localhost', 80, None, None)
+        self.assertEqual(1, file_suite.concurrency)
+        self.assertIsNone(file_suite._tests[1].dependencies)
+
+    def test_depends_on_later_test(self):
+        test_yaml = {'concurrency': 2, 'tests': [
+            {'name': 'one', 'GET': '/', 'depends_on': ['two']},
+            {'name': 'two', 'GET': '/'},
+        ]}
+        with self.assertRaises(exception.GabbiFormatError) as failure:
+            suitemaker.test_suite_from_dict(
+                self.loader, 'foo', test_yaml, '.', 'localhost', 80, None,
+                None)
+        self.assertIn('"one" depends_on "two" which is not an earlier test',
+                      str(failure.exception))
+
+    def test_invalid_concurrency(self):
+        test_yaml = {'concurrency': 'many', 'tests': [
+            {'name': 'one', 'GET': '/'},
+        ]}
+        with self.assertRaises(exception.GabbiFormatError) as failure:
+            suitemaker.test_suite_from_dict(
+                self.loader, 'foo', test_yaml, '.', 'localhost', 80, None,
+                None)
+        self.assertIn('concurrency must be a positive integer',
+                      str(failure.exception))
+
+    def test_cookie_jar_not_concurrent(self):
+        test_yaml = {'concurrency': 2, 'cookie_jar': True, 'tests': [
+            {'name': 'one', 'GET': '/'},
+        ]}
+        with self.assertRaises(exception.GabbiFormatError) as failure:
+            suitemaker.test_suite_from_dict(
+                self.loader, 'foo', test_yaml, '.', 'localhost', 80, None,
+                None)
+        self.assertIn('cookie_jar may not be used with a concurrency',
+                      str(failure.exception))
+
+    def test_test_maker_loader_position(self):
+        with warnings.catch_warnings(record=True) as caught:
+            maker = suitemaker.TestMaker(
+                'foo', {}, '.', [], self.loader, 'localhost', 80, None,
+                '/prefix', [], [])
+        self.assertEqual(['DeprecationWarning'],
+                         [warning.category.__name__ for warning in caught])
+        self.assertEqual('localhost', maker.host)
+        self.assertEqual(80, maker.port)
+        self.assertEqual('/prefix', maker.prefix)
+
+    def test_test_names(self):
+        test_yaml = {'tests': [
+            {'name': 'one', 'GET': '/'},
+            {'name': 'Two Words', 'GET': '/'},
+        ]}
+        self.assertEqual(['foo_one', 'foo_two_words'],
+                         suitemaker.test_names('foo', test_yaml))
+        # A malformed suite must be made to report the problem.
+        for test_yaml in ({}, {'tests': [{'GET': '/'}]},
+                          {'tests': [{'name': '', 'GET': '/'}]},
+                          {'tests': ['one']}):
+            self.assertIsNone(suitemaker.test_names('foo', test_yaml))
+
+    def test_test_tags(self):
+        test_yaml = {'defaults': {'tags': ['all']}, 'tests': [
+            {'name': 'one', 'GET': '/'},
+            {'name': 'two', 'GET': '/', 'tags': ['smoke', 'fast']},
+            {'name': 'three', 'GET': '/', 'tags': ['slow']},
+        ]}
+        self.assertEqual([{'all'}, {'all', 'smoke', 'fast'}, {'all', 'slow'}],
+                         suitemaker.test_tags(test_yaml))
+        self.assertEqual(
+            ['foo_two'],
+            suitemaker.select_tests('foo', test_yaml,
+                                    lambda name, tags: 'smoke' in tags))
+        self.assertIsNone(suitemaker.test_tags({'tests': [
+            {'name': 'one', 'GET': '/', 'tags': [{'not': 'hashable'}]}]}))
+        # Tags are strings, as they are on the command line.
+        self.assertEqual([{'1', 'smoke'}], suitemaker.test_tags({'tests': [
+            {'name': 'one', 'GET': '/', 'tags': [1, 'smoke']}]}))
@@ -13,11 +13,130 @@
 """Test functions from the utils module.
 """
 
+import datetime
+import io
+import os
+import tempfile
+import threading
+import time
 import unittest
+from unittest import mock
 
+import yaml
+
+from gabbi import exception
 from gabbi import utils
 
 
+class LoadYamlTest(unittest.TestCase):
+
+    def test_safe(self):
+        with self.assertRaises(yaml.constructor.ConstructorError):
+            utils.load_yaml(io.StringIO('a: !!python/name:os.system\n'))
+
+    def test_unsafe_uses_registered_constructors(self):
+        yaml.add_constructor('!Tagged', lambda loader, node: 'tagged',
+                             Loader=yaml.Loader)
+        self.addCleanup(yaml.Loader.yaml_constructors.pop, '!Tagged')
+        self.assertEqual({'a': 'tagged'},
+                         utils.load_yaml(io.StringIO('a: !Tagged 1\n'),
+                                         safe=False))
+
+
+class LoadDocumentsTest(unittest.TestCase):
+
+    def test_yaml_documents(self):
+        source = ('%YAML 1.1\n---\ntests: [one]\n...\n# between\n'
+                  '---\ntests: [two]\n--- {tests: [three]}\n')
+        self.assertEqual(
+            [{'tests': ['one']}, {'tests': ['two']}, {'tests': ['three']}],
+            list(utils.load_documents(io.StringIO(source))))
+
+    def test_document_parsed_when_read(self):
+        lines = ['tests: [one]\n', '---\n', 'tests: [two]\n']
+        handle = mock.Mock(readline=mock.Mock(side_effect=lines + ['']))
+        documents = utils.load_documents(handle)
+        self.assertEqual({'tests': ['one']}, next(documents))
+        self.assertEqual(2, handle.readline.call_count)
+
+    def test_json_lines(self):
+        source = '\n{"tests": [{"name": "a: b"}]}\n\n{"tests": []}\n'
+        with mock.patch('yaml.load') as load:
+            self.assertEqual([{'tests': [{'name': 'a: b'}]}, {'tests': []}],
+                             list(utils.load_documents(io.StringIO(source))))
+            load.assert_not_called()
+
+    def test_document_end_parsed_at_once(self):
+        lines = ['tests: [one]\n', '...\n', 'tests: [two]\n']
+        handle = mock.Mock(readline=mock.Mock(side_effect=lines + ['']))
+        documents = utils.load_documents(handle)
+        self.assertEqual({'tests': ['one']}, next(documents))
+        self.assertEqual(2, handle.readline.call_count)
+
+    def test_invalid_json_line(self):
+        source = '{"tests": []}\n\n{"tests": [\n'
+        documents = utils.load_documents(io.StringIO(source))
+        self.assertEqual({'tests': []}, next(documents))
+        with self.assertRaises(exception.GabbiFormatError) as failure:
+            next(documents)
+        self.assertIn('invalid JSON on line 3 of input',
+                      str(failure.exception))
+
+    def test_json_document_over_lines(self):
+        source = '{\n  "tests": []\n}\n'
+        self.assertEqual([{'tests': []}],
+                         list(utils.load_documents(io.StringIO(source))))
+
+    def test_empty(self):
+        self.assertEqual([None],
+                         list(utils.load_documents(io.StringIO(''))))
+
+
+class LoadYamlCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        super(LoadYamlCacheTest, self).setUp()
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        super(LoadYamlCacheTest, self).tearDown()
+        for name in os.listdir(self.cache_dir):
+            os.unlink(os.path.join(self.cache_dir, name))
+        os.rmdir(self.cache_dir)
+
+    def _load(self, source, safe=True):
+        return utils.load_yaml(io.StringIO(source), safe=safe,
+                               cache_dir=self.cache_dir)
+
+    def test_cached(self):
+        source = 'tests:\n- name: one\n  GET: /\n  data: !!binary YQ==\n'
+        expected = {'tests': [{'name': 'one', 'GET': '/', 'data': b'a'}]}
+        self.assertEqual(expected, self._load(source))
+        self.assertEqual(1, len(os.listdir(self.cache_dir)))
+        with mock.patch('yaml.load') as load:
+            self.assertEqual(expected, self._load(source))
+            load.assert_not_called()
+            # The key includes the YAML and the loader.
+            self._load(source + '# changed\n')
+            self._load(source, safe=False)
+            self.assertEqual(2, load.call_count)
+
+    def test_json_not_parsed_as_yaml(self):
+        handle = io.StringIO('{"tests": [{"name": "one", "GET": "/"}]}')
+        handle.name = 'suite.json'
+        with mock.patch('yaml.load') as load:
+            self.assertEqual({'tests': [{'name': 'one', 'GET': '/'}]},
+                             utils.load_yaml(handle,
+                                             cache_dir=self.cache_dir))
+            load.assert_not_called()
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+    def test_not_cached_if_not_marshallable(self):
+        self.assertEqual({'when': datetime.date(2024, 1, 2)},
+                         self._load('when: 2024-01-02\n'))
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+
 class BinaryTypesTest(unittest.TestCase):
 
     BINARY_TYPES = [
@@ -283,3 +402,83 @@ class UtilsHostInfoFromTarget(unittest.TestCase):
             '[::1]:999',
             '::1',
             expected_port='999')
+
+
+class ShardTest(unittest.TestCase):
+
+    names = ['a.yaml', 'b.yaml', 'c.yaml', 'd.yaml', 'e.yaml', 'f.yaml']
+
+    def test_parse_shard(self):
+        self.assertEqual((2, 4), utils.parse_shard('2/4'))
+        for shard in ('0/4', '5/4', '2', 'two/four', None):
+            with self.assertRaises(ValueError):
+                utils.parse_shard(shard)
+
+    def _shards(self, count, timings=None):
+        return [utils.shard_files(self.names, index, count, timings)
+                for index in range(1, count + 1)]
+
+    def test_every_file_in_one_shard(self):
+        for timings in (None, {'a.yaml': 3, 'c.yaml': 1}):
+            shards = self._shards(3, timings)
+            self.assertEqual(sorted(self.names),
+                             sorted(sum(shards, [])))
+            # Each shard keeps the order of the files.
+            for shard in shards:
+                self.assertEqual(sorted(shard), shard)
+            self.assertEqual(shards, self._shards(3, timings))
+
+    def test_balanced_by_timings(self):
+        timings = {'a.yaml': 10, 'b.yaml': 6, 'c.yaml': 5, 'd.yaml': 4,
+                   'e.yaml': 1}
+        # f.yaml takes the mean time, 5.2 seconds.
+        self.assertEqual([['a.yaml', 'e.yaml'],
+                          ['b.yaml', 'd.yaml'],
+                          ['c.yaml', 'f.yaml']],
+                         self._shards(3, timings))
+
+    def test_timings_file(self):
+        with tempfile.TemporaryDirectory() as timings_dir:
+            path = os.path.join(timings_dir, 'timings.json')
+            self.assertEqual({}, utils.load_timings(path))
+            utils.save_timings(path, {'a.yaml': 1.5})
+            utils.save_timings(path, {'b.yaml': 2})
+            self.assertEqual({'a.yaml': 1.5, 'b.yaml': 2},
+                             utils.load_timings(path))
+            # A failed save leaves the file as it was.
+            with self.assertRaises(TypeError):
+                utils.save_timings(path, {'c.yaml': object()})
+            self.assertEqual({'a.yaml': 1.5, 'b.yaml': 2},
+                             utils.load_timings(path))
+            self.assertEqual(['timings.json', 'timings.json.lock'],
+                             sorted(os.listdir(timings_dir)))
+
+    def test_timings_saved_at_once(self):
+        load_timings = utils.load_timings
+
+        def slow_load_timings(path):
+            timings = load_timings(path)
+            time.sleep(0.1)
+            return timings
+
+        with tempfile.TemporaryDirectory() as timings_dir:
+            path = os.path.join(timings_dir, 'timings.json')
+            with mock.patch('gabbi.utils.load_timings', slow_load_timings):
+                saves = [threading.Thread(target=utils.save_timings,
+                                          args=(path, {name: 1}))
+                         for name in ('a.yaml', 'b.yaml')]
+                for save in saves:
+                    save.start()
+                for save in saves:
+                    save.join()
+            self.assertEqual({'a.yaml': 1, 'b.yaml': 1},
+                             utils.load_timings(path))
+
+    def test_timings_key(self):
+        timings = os.path.join('gabbits', 'timings.json')
+        self.assertEqual('foo.yaml', utils.timings_key(
+            os.path.join('gabbits', 'foo.yaml'), timings))
+        self.assertEqual('sub/foo.yaml', utils.timings_key(
+            os.path.abspath(os.path.join('gabbits', 'sub', 'foo.yaml')),
+            timings))
+        self.assertEqual('../foo.yaml', utils.timings_key('foo.yaml', timings))
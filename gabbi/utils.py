@@ -13,15 +13,48 @@
 """Utility functions grab bag."""
 
 import io
+import json
+import marshal
 import os
+import sys
 import urllib.parse as urlparse
+import zlib
 
-import colorama
 import yaml
 
+from gabbi import __version__
+from gabbi.exception import GabbiFormatError
+
 ConnectionRefused = ConnectionRefusedError
 
 
+if yaml.__with_libyaml__:
+    # The libyaml parser is many times faster than the pure Python one.
+    # Unlike yaml.CSafeLoader and yaml.CLoader, these loaders inherit
+    # the constructors and resolvers of yaml.SafeLoader and yaml.Loader,
+    # where yaml.add_constructor and yaml.YAMLObject register them, so
+    # they make the same data.
+
+    class SafeLoader(yaml.cyaml.CParser, yaml.SafeLoader):
+        """yaml.SafeLoader with the libyaml parser."""
+
+        def __init__(self, stream):
+            yaml.cyaml.CParser.__init__(self, stream)
+            yaml.constructor.SafeConstructor.__init__(self)
+            yaml.resolver.Resolver.__init__(self)
+
+    class Loader(yaml.cyaml.CParser, yaml.Loader):
+        """yaml.Loader with the libyaml parser."""
+
+        def __init__(self, stream):
+            yaml.cyaml.CParser.__init__(self, stream)
+            yaml.constructor.Constructor.__init__(self)
+            yaml.resolver.Resolver.__init__(self)
+else:
+    SafeLoader = yaml.SafeLoader
+    Loader = yaml.Loader
+
+
 def create_url(base_url, host, port=None, prefix='', ssl=False):
     """Given pieces of a path-based url, return a fully qualified url."""
     scheme = 'http'
@@ -85,27 +118,164 @@ def get_colorizer(stream):
     Only if stream is a tty .
     """
     if stream.isatty() or os.environ.get('GABBI_FORCE_COLOR', False):
+        import colorama
         colorama.init()
         return _colorize
     else:
         return lambda x, y: y
 
 
-def load_yaml(handle=None, yaml_file=None, safe=True):
+def load_yaml(handle=None, yaml_file=None, safe=True, cache_dir=None):
     """Read and parse any YAML file or filehandle.
 
     Let exceptions flow where they may.
 
     If no file or handle is provided, read from STDIN.
+
+    If cache_dir is provided, the parsed data is kept in that directory
+    and used again while the YAML, and the version of gabbi, are the
+    same.
+
+    A file, or handle, with a name ending in ``.json`` is parsed with
+    the json module.
     """
-    loader = yaml.SafeLoader if safe else yaml.Loader
+    loader = SafeLoader if safe else Loader
 
     if yaml_file:
         with io.open(yaml_file, encoding='utf-8') as source:
-            return yaml.load(source.read(), Loader=loader)
+            source = source.read()
+    else:
+        # This will intentionally raise AttributeError if handle is None.
+        source = handle.read()
+        yaml_file = getattr(handle, 'name', None)
+
+    if isinstance(yaml_file, str) and yaml_file.endswith('.json'):
+        return json.loads(source)
+    if cache_dir:
+        return _load_cached_yaml(source, loader, cache_dir)
+    return yaml.load(source, Loader=loader)
+
+
+def load_documents(handle, safe=True, cache_dir=None):
+    """Parse, and yield, each document in handle as soon as it is read.
+
+    The handle is read a line at a time. YAML documents are separated
+    by lines starting with ``---`` or ``...`` and each is parsed, as with
+    load_yaml, only once the marker after it, or the end of input, has
+    been read. A producer which wants a document used at once should
+    end it with a ``...`` line. If the first line that is not blank is a
+    complete JSON object, the input is read as JSON Lines, one document
+    per line, and each is yielded as soon as its line is read. A line
+    which is not valid JSON raises GabbiFormatError.
+
+    An input with no documents yields ``None``, as load_yaml would.
+    """
+    lines = iter(handle.readline, '')
+    document = []
+    for line in lines:
+        document.append(line)
+        if line.strip():
+            break
+    first = document[-1] if document else ''
+    if first.lstrip().startswith('{'):
+        try:
+            data = json.loads(first)
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            yield data
+            for number, line in enumerate(lines, len(document) + 1):
+                if not line.strip():
+                    continue
+                try:
+                    data = json.loads(line)
+                except ValueError as exc:
+                    raise GabbiFormatError(
+                        'invalid JSON on line %d of input: %s'
+                        % (number, getattr(exc, 'msg', exc)))
+                yield data
+            return
+
+    found = False
+    for line in lines:
+        start = _is_marker(line, '---')
+        if start or _is_marker(line, '...'):
+            if _has_content(document):
+                found = True
+                yield load_yaml(io.StringIO(''.join(document)), safe=safe,
+                                cache_dir=cache_dir)
+                document = []
+            elif not start:
+                document = []
+            if start:
+                # Keep the marker, and directives before it, with the
+                # document it starts.
+                document.append(line)
+        else:
+            document.append(line)
+    if _has_content(document) or not found:
+        yield load_yaml(io.StringIO(''.join(document)), safe=safe,
+                        cache_dir=cache_dir)
+
+
+def _is_marker(line, marker):
+    """True if line is, or starts with, the YAML document marker."""
+    return line.startswith(marker) and line[3:4] in ('', ' ', '\t',
+                                                     '\r', '\n')
+
+
+def _has_content(lines):
+    """True if lines have more than blanks, comments and directives."""
+    for line in lines:
+        stripped = line.strip()
+        if stripped and stripped != '---' and stripped[0] not in '#%':
+            return True
+    return False
+
+
+def _load_cached_yaml(source, loader, cache_dir):
+    """Parse YAML with loader, keeping the result in cache_dir.
+
+    The data is stored with marshal, which is fast to load and, unlike
+    pickle, does not run code. Data marshal cannot store, such as the
+    Python objects an unsafe loader may make, is not cached.
+    """
+    import hashlib
+    import tempfile
+
+    key = hashlib.sha256()
+    for part in (__version__, loader.__name__, sys.version,
+                 str(marshal.version), source):
+        key.update(part.encode('utf-8'))
+        key.update(b'\0')
+    path = os.path.join(cache_dir, key.hexdigest() + '.marshal')
+    try:
+        with open(path, 'rb') as cached:
+            return marshal.load(cached)
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
 
-    # This will intentionally raise AttributeError if handle is None.
-    return yaml.load(handle.read(), Loader=loader)
+    data = yaml.load(source, Loader=loader)
+    try:
+        dumped = marshal.dumps(data)
+    except ValueError:
+        return data
+    # Write to a temporary file first so a concurrent run never reads
+    # a partial file. The cache is an optimization, so failing to write
+    # it is not an error.
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as temp:
+                temp.write(dumped)
+            os.replace(temp_path, path)
+        except OSError:
+            os.unlink(temp_path)
+            raise
+    except OSError:
+        pass
+    return data
 
 
 def not_binary(content_type):
@@ -153,8 +323,111 @@ def host_info_from_target(target, prefix=None):
     return split_url.hostname, split_url.port, split_url.path, force_ssl
 
 
+def parse_shard(shard):
+    """Parse INDEX/COUNT into a tuple of a shard index, from 1, and count.
+
+    Raises ValueError if shard is malformed.
+    """
+    try:
+        index, count = (int(part) for part in shard.split('/'))
+    except (AttributeError, ValueError):
+        raise ValueError('shard must be INDEX/COUNT, not "%s"' % shard)
+    if not 1 <= index <= count:
+        raise ValueError('shard index must be from 1 to %s, not %s'
+                         % (count, index))
+    return index, count
+
+
+def shard_files(names, index, count, timings=None):
+    """Choose the names of the test files in one of count shards.
+
+    Whole files are sharded, so sequences of tests stay together. If
+    there are timings, a mapping of name to the seconds the file took
+    to run, the files are packed into the shards longest first, each
+    into the shard with the least time so far. A file with no timing
+    is assumed to take the mean time. Without timings each file goes
+    in a shard chosen by a hash of its name. Either way every shard
+    makes the same choice. The chosen names are returned in order.
+    """
+    known = [timings[name] for name in names if name in (timings or {})]
+    if not known:
+        return [name for name in names
+                if zlib.crc32(name.encode('utf-8')) % count == index - 1]
+
+    mean = sum(known) / len(known)
+    loads = [0.0] * count
+    chosen = set()
+    by_time = sorted(names, key=lambda name: (-timings.get(name, mean), name))
+    for name in by_time:
+        shard = min(range(count), key=lambda shard: (loads[shard], shard))
+        loads[shard] += timings.get(name, mean)
+        if shard == index - 1:
+            chosen.add(name)
+    return [name for name in names if name in chosen]
+
+
+def timings_key(test_file, timings_path):
+    """Name test_file, in the timings saved in the file at timings_path.
+
+    The name is the path of test_file relative to the directory of the
+    timings file, with ``/`` separators, so gabbi-run and build_tests
+    find the same timings for a file however its path is given.
+    """
+    timings_dir = os.path.dirname(os.path.abspath(timings_path))
+    return os.path.relpath(
+        os.path.abspath(test_file), timings_dir).replace(os.sep, '/')
+
+
+def load_timings(path):
+    """Read the timings of test files, in seconds, from a JSON file.
+
+    A missing file has no timings.
+    """
+    try:
+        with open(path) as timings_file:
+            return json.load(timings_file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_timings(path, timings):
+    """Add timings of test files to those in a JSON file.
+
+    The file is replaced by a complete new one, so it is never read
+    partly written. Where ``fcntl`` is available, the file is read,
+    updated and replaced holding a lock on ``<path>.lock``, so
+    processes on one host saving at the same time keep each other's
+    timings. Elsewhere, or on file systems without locks, a process
+    may lose the timings of another saving at the same time, so
+    shards run at once should save to files of their own.
+    """
+    import tempfile
+    try:
+        import fcntl
+    except ImportError:
+        # Not available on Windows.
+        fcntl = None
+
+    with open(path + '.lock', 'a') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        all_timings = load_timings(path)
+        all_timings.update(timings)
+        handle, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'w') as timings_file:
+                json.dump(all_timings, timings_file, indent=2,
+                          sort_keys=True)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+
 def _colorize(color, message):
     """Add a color to the message."""
+    import colorama
     try:
         return getattr(colorama.Fore, color) + message + colorama.Fore.RESET
     except AttributeError: